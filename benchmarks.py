@@ -0,0 +1,310 @@
+"""
+Benchmarks for the inventory and comparison hot paths, outside Streamlit.
+
+Builds synthetic repositories with the real layout
+(Proyecto/YYYYMMDD/Responsable/file_vN.pdf) plus matching drive_map.json and
+notes.json, times each stage on its own and appends one JSON line per
+(size, stage) so results can be compared release to release.
+
+    python benchmarks.py --sizes 1000 10000 --output bench_results.jsonl
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime, timedelta
+
+import inventory
+import version_comparator
+
+PROJECTS = ["Puente Norte", "Viaducto Centro", "Distribuidor Sur", "Paso Oriente", "Entronque Poniente"]
+PEOPLE = ["Ana", "Luis", "Carla", "Jorge", "Marta", "Pedro"]
+# Mix of keywords so every categorize_document / extract_subcategory branch is exercised
+KEYWORDS = [
+    "MEMORIA-CALCULO", "PROCESO-CONSTRUCTIVO", "GEOMETRICO", "ODT", "ZAPATA", "PILOTE",
+    "COLUMNA", "TRABE", "LOSA", "CABALLETE", "NU-200", "FACHADA", "MURO", "PLANO", "DETALLE"
+]
+EXTENSIONS = ["pdf"] * 8 + ["dwg", "xlsx"]
+STAGES = ["startup", "scan_directory", "build_dataframe", "find_drive_link", "categorize_document", "compare_folders", "summarize_changes"]
+
+# --- Synthetic Repository ---
+def synthetic_paths(n_files, seed=0):
+    """
+    Deterministic list of relative paths (with "/" separators) in the
+    Proyecto/YYYYMMDD/Responsable/file_vN.ext layout. Documents come in
+    families of 1-3 revisions sharing the same folder.
+    """
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 6)
+    paths = []
+    doc = 0
+    while len(paths) < n_files:
+        project = PROJECTS[doc % len(PROJECTS)]
+        day = start + timedelta(days=rng.randrange(365))
+        person = rng.choice(PEOPLE)
+        keyword = rng.choice(KEYWORDS)
+        ext = rng.choice(EXTENSIONS)
+        folder = f"{project}/{day:%Y%m%d}/{person}"
+        for ver in range(1, rng.randint(1, 3) + 1):
+            paths.append(f"{folder}/{keyword}-{doc:06d}_v{ver}.{ext}")
+        doc += 1
+    return paths[:n_files]
+
+def write_tree(root, rel_paths, seed=0, mutate=0.0):
+    """
+    Creates the files below root with sizes between 1 KB and 200 KB.
+    Files are sparse (truncate), so large trees are cheap on disk.
+    mutate: fraction of files whose size changes (used for the "v2" folder).
+    """
+    rng = random.Random(seed)
+    mutation = random.Random(seed + 1)
+    for rel in rel_paths:
+        size = rng.randint(1_000, 200_000)
+        if mutate and mutation.random() < mutate:
+            size += mutation.randint(1, 5_000)
+        full_path = os.path.join(root, *rel.split("/"))
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, "wb") as f:
+            f.truncate(size)
+
+def synthetic_drive_map(rel_paths, seed=0, coverage=0.8):
+    # Same entry shape as drive_service.build_drive_map
+    rng = random.Random(seed)
+    drive_map = {}
+    for rel in rel_paths:
+        if rng.random() >= coverage: continue
+        file_id = f"{rng.getrandbits(64):016x}"
+        created = datetime(2025, 1, 1) + timedelta(seconds=rng.randrange(365 * 86400))
+        modified = created + timedelta(seconds=rng.randrange(30 * 86400))
+        drive_map[rel] = {
+            "id": file_id,
+            "webViewLink": f"https://drive.google.com/file/d/{file_id}/view",
+            "modifiedTime": modified.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+            "createdTime": created.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+            "size": rng.randint(10_000, 5_000_000),
+            "md5Checksum": f"{rng.getrandbits(128):032x}"
+        }
+    return drive_map
+
+def synthetic_notes(rel_paths, seed=0, coverage=0.3):
+    # Keys use the OS separator, like the IDs produced by scan_directory
+    rng = random.Random(seed)
+    notes = {}
+    for rel in rel_paths:
+        if rng.random() >= coverage: continue
+        notes[os.path.join(*rel.split("/"))] = {
+            "status": rng.choice(["Pendiente", "En Revisión", "Aprobado", "Rechazado"]),
+            "notes": rng.choice(["", "Revisar cotas", "Falta firma", "Ok"]),
+            "description": rng.choice(["", "Plano: Armado de zapata", "Contenido: Memoria de cálculo"]),
+            "reviewed": rng.random() < 0.5,
+            "_rev": rng.randint(1, 5)
+        }
+    return notes
+
+def generate_repository(root, n_files, seed=0):
+    """
+    Writes a synthetic repository under root:
+        root/data/...          inventory tree
+        root/data_v2/...       same tree with ~10% files modified/added/removed
+        root/drive_map.json
+        root/notes.json
+    Returns (data_dir, data_v2_dir, drive_map, notes_db).
+    """
+    rel_paths = synthetic_paths(n_files, seed)
+    data_dir = os.path.join(root, "data")
+    data_v2_dir = os.path.join(root, "data_v2")
+    write_tree(data_dir, rel_paths, seed)
+
+    # v2: drop 5%, add 5% new documents, resize 10% of the rest
+    cut = len(rel_paths) // 20
+    v2_paths = rel_paths[cut:] + [p.replace("_v", "_NUEVO_v") for p in rel_paths[:cut]]
+    write_tree(data_v2_dir, v2_paths, seed, mutate=0.1)
+
+    drive_map = synthetic_drive_map(rel_paths, seed)
+    notes_db = synthetic_notes(rel_paths, seed)
+    with open(os.path.join(root, "drive_map.json"), "w", encoding="utf-8") as f:
+        json.dump(drive_map, f, ensure_ascii=False)
+    with open(os.path.join(root, "notes.json"), "w", encoding="utf-8") as f:
+        json.dump(notes_db, f, ensure_ascii=False, indent=4)
+    return data_dir, data_v2_dir, drive_map, notes_db
+
+def synthetic_texts(n_lines, seed=0, change_rate=0.05):
+    """Two versions of an extracted PDF text with ~change_rate of the lines edited, added or removed."""
+    rng = random.Random(seed)
+    words = ["CONCRETO", "ACERO", "f'c=250", "kg/cm2", "EJE", "NIVEL", "CORTE", "VER DETALLE", "ZAPATA", "COLUMNA"]
+    old = [" ".join(rng.choice(words) for _ in range(rng.randint(3, 9))) + f" {k}" for k in range(n_lines)]
+    new = []
+    for line in old:
+        r = rng.random()
+        if r < change_rate / 3: continue
+        if r < 2 * change_rate / 3:
+            new.append(line + " (MODIFICADO)")
+        else:
+            new.append(line)
+        if rng.random() < change_rate / 3:
+            new.append("NOTA AGREGADA " + rng.choice(words))
+    return "\n".join(old), "\n".join(new)
+
+# --- Cold Start ---
+# What dashboard.py imports before the first paint, then each lazily imported
+# feature module on top of it. Every group is measured in the same fresh
+# interpreter, so its time is the extra cost of first touching that feature.
+STARTUP_GROUPS = [
+    ("startup", ["streamlit", "pandas", "inventory", "notes_store", "diagnostics"]),
+    ("lazy:altair", ["altair"]),
+    ("lazy:version_comparator", ["version_comparator", "pypdf"]),
+    ("lazy:search_index", ["search_index"]),
+    ("lazy:pdf_server", ["pdf_server"]),
+    ("lazy:supabase_sync", ["supabase_sync"]),
+]
+
+STARTUP_PROBE = r"""
+import sys, json, time
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+results = []
+for stage, modules in json.loads(sys.argv[1]):
+    t0 = time.perf_counter()
+    error = None
+    try:
+        for name in modules: __import__(name)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None
+    results.append({"stage": stage, "seconds": time.perf_counter() - t0, "max_rss_kb": max_rss, "error": error})
+print(json.dumps(results))
+"""
+
+def measure_startup(groups=STARTUP_GROUPS):
+    """
+    Imports each group in a fresh interpreter (repo root as cwd).
+    Returns one dict per group: stage, seconds, max_rss_kb (peak so far, Unix only), error.
+    """
+    out = subprocess.run(
+        [sys.executable, "-c", STARTUP_PROBE, json.dumps(groups)],
+        capture_output=True, text=True, timeout=300,
+        cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    if out.returncode != 0:
+        return [{"stage": "startup", "seconds": None, "max_rss_kb": None, "error": out.stderr.strip()[-500:]}]
+    return json.loads(out.stdout)
+
+# --- Runner ---
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, timeout=10,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def timed(fn, repeat):
+    """Best wall time over repeat runs (least affected by noise) and the last result."""
+    best = None
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def run_size(n_files, workdir, stages, repeat=3, lookups=500, text_lines=2000, seed=0):
+    """Generates one repository and yields (stage, seconds, items) per stage."""
+    root = os.path.join(workdir, f"repo_{n_files}")
+    t0 = time.perf_counter()
+    data_dir, data_v2_dir, drive_map, notes_db = generate_repository(root, n_files, seed)
+    yield "generate", time.perf_counter() - t0, n_files
+
+    # Every later stage needs the scan result, so it is always computed
+    seconds, raw_files = timed(lambda: inventory.scan_directory(data_dir), repeat)
+    if "scan_directory" in stages:
+        yield "scan_directory", seconds, len(raw_files)
+
+    if "build_dataframe" in stages:
+        seconds, df = timed(lambda: inventory.build_dataframe(raw_files, notes_db, drive_map), repeat)
+        yield "build_dataframe", seconds, len(df)
+
+    if "find_drive_link" in stages:
+        # Index build (once per map) plus a fixed sample of lookups
+        sample = random.Random(seed).sample(raw_files, min(lookups, len(raw_files)))
+        def lookup_sample():
+            links = inventory.drive_link_index(drive_map)
+            return [inventory.find_drive_link(f["Documento"], f["Proyecto"], drive_map, links) for f in sample]
+        seconds, _ = timed(lookup_sample, repeat)
+        yield "find_drive_link", seconds, len(sample)
+
+    if "categorize_document" in stages:
+        seconds, _ = timed(lambda: [inventory.categorize_document(f["Documento"], f["Ruta"]) for f in raw_files], repeat)
+        yield "categorize_document", seconds, len(raw_files)
+
+    if "compare_folders" in stages:
+        seconds, comp_df = timed(lambda: version_comparator.compare_folders(data_dir, data_v2_dir), repeat)
+        yield "compare_folders", seconds, len(comp_df)
+
+    if "summarize_changes" in stages:
+        text1, text2 = synthetic_texts(text_lines, seed)
+        seconds, _ = timed(lambda: version_comparator.summarize_changes(text1, text2), repeat)
+        yield "summarize_changes", seconds, text_lines
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks del inventario sobre repositorios sintéticos.")
+    parser.add_argument("--sizes", type=int, nargs="*", default=[1_000, 10_000],
+                        help="Número de archivos por repositorio (p. ej. 1000 10000 100000)")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--repeat", type=int, default=3, help="Repeticiones por etapa (se reporta el mejor tiempo)")
+    parser.add_argument("--lookups", type=int, default=500, help="Búsquedas de find_drive_link por tamaño")
+    parser.add_argument("--text-lines", type=int, default=2000, help="Líneas del texto sintético para summarize_changes")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Archivo JSON Lines al que se agregan los resultados (por defecto stdout)")
+    parser.add_argument("--workdir", help="Carpeta para los repositorios sintéticos (por defecto una temporal)")
+    parser.add_argument("--keep", action="store_true", help="No borrar los repositorios generados")
+    args = parser.parse_args(argv)
+
+    meta = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "seed": args.seed
+    }
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="bench_")
+    out = open(args.output, "a", encoding="utf-8") if args.output else sys.stdout
+    try:
+        if "startup" in args.stages:
+            # Best of --repeat cold starts (each in a new interpreter)
+            runs = [measure_startup() for _ in range(args.repeat)]
+            for group in zip(*runs):
+                best = min(group, key=lambda r: r["seconds"] if r["seconds"] is not None else float("inf"))
+                record = dict(meta, size=None, stage=best["stage"],
+                              seconds=round(best["seconds"], 6) if best["seconds"] is not None else None,
+                              max_rss_kb=best["max_rss_kb"], error=best["error"])
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+        for size in args.sizes:
+            for stage, seconds, items in run_size(size, workdir, args.stages, args.repeat,
+                                                  args.lookups, args.text_lines, args.seed):
+                record = dict(meta, size=size, stage=stage, seconds=round(seconds, 6), items=items)
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                if out is not sys.stdout:
+                    print(f"{size:>8} {stage:<20} {seconds:10.4f}s")
+            if not args.keep:
+                shutil.rmtree(os.path.join(workdir, f"repo_{size}"), ignore_errors=True)
+    finally:
+        if out is not sys.stdout: out.close()
+        if not args.keep and not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import Future
+
+BLOB_CACHE_DIR = "blob_cache"
+BLOB_CACHE_MAX_BYTES = 2 * 1024 ** 3
+CHUNK_SIZE = 1024 * 1024
+
+def file_md5(path):
+    md5 = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+class DriveBackend:
+    """
+    Downloads file content from the Drive API (files.get alt=media).
+    The service is built on first use, so creating the cache costs nothing.
+    Any object with download(file_id, f) can replace it (e.g. a fake Drive in tests).
+    """
+    def __init__(self, service=None):
+        self.service = service
+        self.lock = threading.Lock()
+
+    def _get_service(self):
+        with self.lock:
+            if self.service is None:
+                import drive_service
+                self.service = drive_service.get_drive_service()
+            return self.service
+
+    def download(self, file_id, f):
+        from googleapiclient.http import MediaIoBaseDownload
+        request = self._get_service().files().get_media(fileId=file_id)
+        downloader = MediaIoBaseDownload(f, request, chunksize=8 * CHUNK_SIZE)
+        done = False
+        while not done:
+            _, done = downloader.next_chunk()
+
+class BlobCache:
+    """
+    Content-addressed local copies of Drive files: <cache_dir>/<md5Checksum>.
+    The same content is stored once whatever its path, and a file that
+    changed in Drive gets a new checksum (so a stale copy is never served).
+
+    Least recently used blobs are evicted once the total exceeds max_bytes.
+    Recency is the file's access time, set explicitly on every hit, so it
+    survives restarts. Concurrent requests for the same blob share one download.
+    Blobs being read are pinned (see pinned) and never evicted.
+    """
+    def __init__(self, cache_dir=BLOB_CACHE_DIR, max_bytes=BLOB_CACHE_MAX_BYTES, backend=None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.backend = backend or DriveBackend()
+        self.lock = threading.Lock()
+        self.inflight = {} # md5 -> Future of the download in progress
+        self.pins = {} # md5 -> number of callers reading it
+        os.makedirs(cache_dir, exist_ok=True)
+        self.entries = OrderedDict() # md5 -> size, least recently used first
+        blobs = []
+        for name in os.listdir(cache_dir):
+            if name.endswith(".tmp"):
+                # Interrupted download from a previous run
+                try: os.remove(os.path.join(cache_dir, name))
+                except OSError: pass
+                continue
+            stat = os.stat(os.path.join(cache_dir, name))
+            blobs.append((stat.st_atime, name, stat.st_size))
+        for _, name, size in sorted(blobs):
+            self.entries[name] = size
+        self.total = sum(self.entries.values())
+
+    def path_for(self, md5):
+        return os.path.join(self.cache_dir, md5)
+
+    def fetch(self, entry):
+        """
+        Local path for a drive_map.json entry, downloading it if needed.
+        None for entries without id/md5Checksum (link-only maps, Google Docs files).
+        """
+        if not isinstance(entry, dict) or not entry.get("id") or not entry.get("md5Checksum"):
+            return None
+        return self.get(entry["id"], entry["md5Checksum"])
+
+    @contextmanager
+    def pinned(self, entry):
+        """
+        fetch() for a with block: the blob is not evicted until the block exits.
+        A path from fetch() alone can be removed by any later download once
+        the cache is full.
+        """
+        md5 = entry.get("md5Checksum") if isinstance(entry, dict) else None
+        if md5:
+            # Pinned before fetching: nothing can evict it between the download and the read
+            with self.lock:
+                self.pins[md5] = self.pins.get(md5, 0) + 1
+        try:
+            yield self.fetch(entry)
+        finally:
+            if md5:
+                with self.lock:
+                    self.pins[md5] -= 1
+                    if not self.pins[md5]: del self.pins[md5]
+
+    def get(self, file_id, md5):
+        """Local path of the blob with checksum md5 (file_id is only used to download it)."""
+        with self.lock:
+            if md5 in self.entries:
+                self.entries.move_to_end(md5)
+                path = self.path_for(md5)
+                self._touch(path)
+                return path
+            future = self.inflight.get(md5)
+            owner = future is None
+            if owner:
+                future = self.inflight[md5] = Future()
+        if not owner:
+            return future.result()
+
+        try:
+            path = self._download(file_id, md5)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(path)
+            return path
+        finally:
+            with self.lock:
+                self.inflight.pop(md5, None)
+
+    def _download(self, file_id, md5):
+        path = self.path_for(md5)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                self.backend.download(file_id, f)
+            if file_md5(tmp_path) != md5:
+                raise ValueError(f"El contenido descargado de {file_id} no coincide con su md5Checksum")
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path): os.remove(tmp_path)
+        with self.lock:
+            self.entries[md5] = os.path.getsize(path)
+            self.total += self.entries[md5]
+            self._evict(keep=md5)
+        return path
+
+    def _touch(self, path):
+        try:
+            os.utime(path, (time.time(), os.path.getmtime(path)))
+        except OSError:
+            pass
+
+    def _evict(self, keep):
+        """Drops least recently used blobs until within budget, except pinned ones. Needs the lock."""
+        for md5 in list(self.entries):
+            if self.total <= self.max_bytes: break
+            if md5 == keep or md5 in self.pins: continue
+            try:
+                os.remove(self.path_for(md5))
+            except FileNotFoundError:
+                pass
+            except OSError:
+                continue # Still open by a reader (Windows): retried on the next eviction
+            self.total -= self.entries.pop(md5)
+
+    def stats(self):
+        with self.lock:
+            return {"blobs": len(self.entries), "bytes": self.total, "max_bytes": self.max_bytes, "pinned": len(self.pins)}
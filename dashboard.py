@@ -2,21 +2,21 @@ import streamlit as st
 import pandas as pd
 import os
 import json
-from datetime import datetime
+from datetime import datetime, timezone
 import time
-import pypdf
+import threading
 import subprocess
-import altair as alt
-import re
 import base64
 import locale
-import random
-import version_comparator # New module
-try:
-    from supabase_sync import SupabaseSync
-    SUPABASE = SupabaseSync()
-except ImportError:
-    SUPABASE = None
+import functools
+import contextlib
+import inventory
+import notes_store
+import diagnostics
+import indexer
+# Heavy or feature-specific modules (altair, version_comparator/pypdf,
+# supabase_sync, revision_diffs, pdf_server, search_index, blob_cache) are imported where
+# they are first used, so a cold start only pays for what the run touches.
 
 # Try to set locale to Spanish for date formatting
 try:
@@ -34,10 +34,13 @@ IS_CLOUD = "google" in st.secrets
 if IS_CLOUD:
     DATA_DIR = None 
     ROOT_FOLDER_ID = st.secrets["google"].get("root_folder_id", "1f16OjsyvYfDXgdWT5t-mc43gd1IkaFN1")
+    # Disk budget for local copies of Drive files (comparisons and PDF analysis)
+    BLOB_CACHE_MAX_MB = st.secrets["google"].get("blob_cache_max_mb", 2048)
 else:
     DATA_DIR = r"C:\Users\L14\Documents\ThinkPad\Estructuras Control Documental"
 
 NOTES_FILE = "notes.json"
+INDEX_DIR = indexer.INDEX_DIR # Snapshots published by indexer.py (optional)
 CACHE_TTL = 300
 
 st.set_page_config(
@@ -47,6 +50,29 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Timing spans of this run (see diagnostics.py); closed and logged at the end of the script
+diagnostics.start("rerun", st.session_state.setdefault("diag_session", os.urandom(4).hex()))
+
+DIAGNOSTICS_HISTORY = 20
+
+def remember_diagnostics(record):
+    if not record: return
+    history = st.session_state.setdefault("diagnostics_history", [])
+    history.append(record)
+    del history[:-DIAGNOSTICS_HISTORY]
+
+def diagnostics_enabled():
+    """Hidden panel: only shown when the app is opened with ?diag=1"""
+    try:
+        return st.query_params.get("diag") == "1"
+    except AttributeError:
+        return st.experimental_get_query_params().get("diag", [""])[0] == "1"
+
+def rerun_app():
+    """st.rerun() ends the script on the spot: the run's trace is closed first."""
+    remember_diagnostics(diagnostics.finish())
+    st.rerun()
+
 # --- Custom CSS ---
 st.markdown("""
 <style>
@@ -194,11 +220,40 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# --- Cache Dependencies ---
+# Each data source has a process-wide version. Cached loaders take the version of
+# what they depend on as an argument, so bumping one version only invalidates the
+# caches built on top of it (a notes edit never forces a filesystem rescan).
+CACHE_DEPENDENTS = {
+    "inventory": [],
+    "notes": [],
+    # In Cloud mode the inventory itself is built from the Drive map
+    "drive_map": ["inventory"] if IS_CLOUD else [],
+}
+
+@st.cache_resource
+def get_data_versions():
+    return {"lock": threading.Lock(), "versions": {k: 0 for k in CACHE_DEPENDENTS}}
+
+def data_version(source):
+    return get_data_versions()["versions"][source]
+
+def invalidate(*sources):
+    """Bumps the version of the given sources and of everything that depends on them."""
+    registry = get_data_versions()
+    pending = list(sources)
+    with registry["lock"]:
+        while pending:
+            source = pending.pop()
+            registry["versions"][source] += 1
+            pending.extend(CACHE_DEPENDENTS[source])
+
 # --- Persistence Layer ---
 DRIVE_MAP_FILE = "drive_map.json"
 
-@st.cache_data
-def load_drive_map():
+@st.cache_resource(max_entries=2)
+def load_drive_map(version=0):
+    diagnostics.miss("load_drive_map")
     if os.path.exists(DRIVE_MAP_FILE):
         try:
             with open(DRIVE_MAP_FILE, "r", encoding="utf-8") as f:
@@ -206,273 +261,190 @@ def load_drive_map():
         except: return {}
     return {}
 
-def find_drive_link(file_name, project, drive_map):
+@st.cache_resource
+def get_supabase():
+    """Supabase client, created on the first sync. None if the module is unavailable."""
+    try:
+        from supabase_sync import SupabaseSync
+    except ImportError:
+        return None
+    return SupabaseSync()
+
+@st.cache_resource
+def get_version_comparator():
+    """version_comparator (and pypdf behind it), imported on the first comparison."""
+    import version_comparator
+    return version_comparator
+
+@st.cache_resource
+def get_notes_store():
+    """Notes shared by all sessions of this process (copy-on-write snapshots)."""
+    diagnostics.miss("load_notes")
+    return notes_store.NotesStore(NOTES_FILE)
+
+def commit_notes(changes, agg_deltas=None):
     """
-    Intenta encontrar el link de Drive buscando por nombre de archivo.
-    A veces la estructura local no es idéntica a Drive, así que buscamos
-    por coincidencia del nombre del archivo al final de las claves del mapa.
+    Publishes field changes ({ID: {field: (seen, new)}}) to the shared store.
+    Fields someone else changed meanwhile are not overwritten: they are kept
+    in st.session_state['notes_conflicts'] to be reported to the user.
+    With agg_deltas (and no conflicts), the aggregate table is carried over
+    to the new notes stamp instead of being rebuilt.
+    Returns (saved IDs, conflicts); a document counts as saved if any of its fields was applied.
     """
-    # 1. Búsqueda exacta por nombre de archivo
-    for path_key, link in drive_map.items():
-        if path_key.endswith(file_name) or path_key.endswith(f"/{file_name}"):
-             return link
-    return None
-
-def load_notes():
-    if os.path.exists(NOTES_FILE):
+    saved = []
+    with diagnostics.span("save_notes"):
         try:
-            with open(NOTES_FILE, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                return data
-        except: return {}
-    return {}
-
-def save_notes(notes_data):
+            previous, snapshot, conflicts = get_notes_store().apply_changes(changes)
+        except Exception as e:
+            st.error(f"Error Saving DB: {e}")
+            return [], []
+        if snapshot is not previous:
+            saved = [fid for fid in changes if snapshot.data.get(fid) is not previous.data.get(fid)]
+            save_notes(snapshot.data, saved)
+            invalidate("notes")
+            if agg_deltas is not None and not conflicts:
+                update_aggregates(agg_key(previous.stamp), agg_key(snapshot.stamp), agg_deltas)
+    st.session_state['notes_conflicts'] = conflicts
+    return saved, conflicts
+
+def restore_notes(fid, ts):
+    """Point-in-time restore of one document's notes (journaled like any other save)."""
+    with diagnostics.span("save_notes"):
+        try:
+            previous, snapshot = get_notes_store().restore(fid, ts)
+        except Exception as e:
+            st.error(f"Error restaurando: {e}")
+            return False
+        if snapshot is not previous:
+            # Restoring "no entry" is pushed too (as the defaults), or Supabase keeps the old notes
+            save_notes(snapshot.data, [fid])
+            invalidate("notes")
+    return True
+
+def save_notes(notes_data, changed_ids):
+    """
+    Post-commit side effects. notes.json and its journal are written by the
+    NotesStore (every save is fsynced to the journal; history lives in notes_history/).
+    """
     try:
-        # Save main file first for speed
-        with open(NOTES_FILE, "w", encoding="utf-8") as f:
-            json.dump(notes_data, f, indent=4, ensure_ascii=False)
-
-        # Backup Mechanism (Probabilistic optimization)
-        # Only run backup 20% of the time or if it's been a while, to save IO
-        if random.random() < 0.2:
-            backup_dir = "backups"
-            if not os.path.exists(backup_dir):
-                os.makedirs(backup_dir)
-                
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            backup_file = os.path.join(backup_dir, f"notes_backup_{timestamp}.json")
-            
-            with open(backup_file, "w", encoding="utf-8") as f:
-                json.dump(notes_data, f, indent=4, ensure_ascii=False)
-                
-            # Optional: Clean old backups (keep last 50)
-            # Only do this very rarely
-            if random.random() < 0.1:
-                backups = sorted([os.path.join(backup_dir, f) for f in os.listdir(backup_dir)], key=os.path.getmtime)
-                if len(backups) > 50:
-                    for b in backups[:-50]:
-                        try: os.remove(b)
-                        except: pass
-        
         # --- NEW: Supabase Cloud Sync ---
-        if SUPABASE:
-            for path_key, meta in notes_data.items():
-                SUPABASE.sync_oficio(path_key, meta)
+        supabase = get_supabase() if changed_ids else None
+        if supabase:
+            with diagnostics.span("supabase_sync"):
+                for path_key in changed_ids:
+                    supabase.sync_oficio(path_key, notes_data.get(path_key) or {})
                 
-    except Exception as e: st.error(f"Error Saving DB/Backup: {e}")
+    except Exception as e: st.error(f"Error Saving DB/Sync: {e}")
 
 # --- Core Logic & Caching ---
 
-def extract_version(filename):
-    # Match patterns like v1, V2, rev3, R01, etc.
-    patterns = [
-        r"[-_ ]v(\d+)",       # _v1, -v2
-        r"[-_ ]ver(\d+)",     # _ver1
-        r"[-_ ]rev(\d+)",     # _rev0
-        r"[-_ ]R(\d+)",       # _R1
-    ]
-    for p in patterns:
-        match = re.search(p, filename, re.IGNORECASE)
-        if match:
-            return f"V{match.group(1)}"
-    return "V1" # Default
-
-def extract_base_name(filename):
-    name, ext = os.path.splitext(filename)
-    # Remove version suffix patterns like _v1, -V2, _R1, etc.
-    patterns = [
-        r"[-_ ]v\d+$", 
-        r"[-_ ]ver\d+$", 
-        r"[-_ ]rev\d+$", 
-        r"[-_ ]R\d+$",
-        r"v\d+$"
-    ]
-    clean = name
-    for p in patterns:
-        clean = re.sub(p, "", clean, flags=re.IGNORECASE)
-    return clean.strip()
-
-def extract_subcategory(filename, category):
-    # Rule: Memorias -> Memoria
-    if category == "Memorias":
-        return "MEMORIA"
-    
-    name = filename.upper()
-    
-    # Rule: NU 200 -> PREFABRICADOS
-    if "NU-200" in name or "NU 200" in name:
-        return "PREFABRICADOS"
-
-    # Keywords for automatic subcategorization
-    keywords = [
-        "CABALLETE", "ZAPATA", "PILOTE", "TERRACERIA", "EXCAVACION", 
-        "COLUMNA", "VIGA", "LOSA", "ACERO", "MONTAJE", "TRABE", 
-        "PARAPETO", "PROCESO", "GEOMETRICO", "TOPOGRAFIA", "ODT",
-        "ALERO", "ESTRIBO", "DIAFRAGMA", "PRELOSA", "GUARNICION",
-        "BANCO", "TOPE", "NEOPRENO", "MURETE", "PREFABRICADOS", "CABEZAL"
-    ]
-    
-    for k in keywords:
-        if k in name:
-            return k
-            
-    return "GENERAL"
+@st.cache_resource
+def get_revision_precomputer():
+    """Process-wide background worker for 'changes vs previous revision'."""
+    import revision_diffs
+    return revision_diffs.RevisionPrecomputer(revision_diffs.RevisionDiffStore())
 
-@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
-def scan_directory(base_dir):
+def schedule_revision_diffs(rows):
+    """Detects new revisions in a fresh index and queues their diff against the predecessor."""
+    import revision_diffs
+    get_revision_precomputer().submit(revision_diffs.find_revision_pairs(rows))
+
+@st.cache_resource(ttl=CACHE_TTL, show_spinner=False, max_entries=2)
+def load_inventory(base_dir, version=0):
     """
-    Scans the directory and returns a raw list of file dictionaries.
-    In CLOUD mode, it uses the drive_map.json as the inventory source.
+    Cached scan. Returns (raw_files, fingerprint); the fingerprint is the cheap
+    key used downstream instead of hashing the whole inventory.
+    `version` is the inventory version (see invalidate()).
     """
+    diagnostics.miss("scan_directory")
     if IS_CLOUD:
-        drive_map = load_drive_map()
-        raw_files = []
-        for rel_key, link in drive_map.items():
-            # rel_key is something like "ProjectName/20260220/Person/File.pdf"
-            parts = rel_key.split('/')
-            project = parts[0] if len(parts) > 0 else "General"
-            
-            # Simple metadata extraction from name/path
-            filename = parts[-1]
-            ext = filename.split('.')[-1].upper() if '.' in filename else ""
-            
-            # Try to find date and person (mimicking local structure)
-            date_folder = ""
-            person = "Desconocido"
-            if len(parts) > 2 and parts[1].isdigit() and len(parts[1]) == 8:
-                d_str = parts[1]
-                date_folder = f"{d_str[:4]}-{d_str[4:6]}-{d_str[6:]}"
-                if len(parts) > 3: person = parts[2]
-
-            final_date = date_folder if date_folder else datetime.now().strftime("%Y-%m-%d")
-            version = extract_version(filename)
-            
-            raw_files.append({
-                "ID": rel_key,
-                "Proyecto": project,
-                "Fecha": final_date,
-                "FechaCreacion": "Sincronizado de Drive", # We don't have ctime easily without API call
-                "Responsable": person,
-                "Documento": filename,
-                "Ext": ext,
-                "Ruta": rel_key, # In Cloud, ID and Ruta are the same rel_key
-                "ModTime": datetime.now(),
-                "Versión": version
-            })
-        return raw_files
-
-    if not os.path.exists(base_dir): return []
-    
-    raw_files = []
+        raw_files = inventory.scan_drive_map(load_drive_map(data_version("drive_map")))
+    else:
+        raw_files = inventory.scan_directory(base_dir)
     
-    for root, dirs, files in os.walk(base_dir):
-        rel_path = os.path.relpath(root, base_dir)
-        parts = rel_path.split(os.sep)
-        
-        # Structure Parsing
-        project = parts[0] if len(parts) > 0 and parts[0] != "." else "General"
-        date_folder = ""
-        person = "Desconocido"
-        
-        # Try to find Date (YYYYMMDD) and Person
-        if len(parts) > 1 and parts[1].isdigit() and len(parts[1]) == 8:
-            try:
-                # Validate date format (YYYYMMDD)
-                d_str = parts[1]
-                datetime.strptime(d_str, "%Y%m%d") # Raises ValueError if invalid
-                date_folder = f"{d_str[:4]}-{d_str[4:6]}-{d_str[6:]}"
-            except ValueError:
-                # Invalid date format in folder name, ignore
-                date_folder = ""
-                
-            if len(parts) > 2: person = parts[2]
-            
-        for file in files:
-            if file.lower().endswith(('.pdf', '.dwg', '.rvt', '.xlsx', '.doc', '.docx')):
-                full_path = os.path.join(root, file)
-                fid = os.path.relpath(full_path, base_dir)
-                
+    return raw_files, inventory.inventory_fingerprint(raw_files)
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def index_in_process(_raw_files, _drive_map, inventory_stamp, drive_map_stamp):
+    """Categories, versions and Drive links when no indexer is publishing snapshots."""
+    diagnostics.miss("index_files")
+    rows = inventory.index_files(_raw_files, _drive_map)
+    # Runs only on a cache miss, i.e. once per actual scan
+    if not IS_CLOUD: schedule_revision_diffs(rows)
+    return rows
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def load_index_snapshot(index_dir, version):
+    """Snapshot published by indexer.py, loaded once per version. Returns (rows, stamp)."""
+    diagnostics.miss("load_index")
+    snapshot = indexer.load_snapshot(index_dir, version)
+    rows = snapshot["rows"]
+    schedule_revision_diffs(rows[rows["Ext"] == "PDF"].to_dict("records") if not rows.empty else [])
+    return rows, snapshot["stamp"]
+
+def snapshot_mode():
+    """True when rows come from the indexer's snapshots (rescans and link updates are its job)."""
+    return not IS_CLOUD and indexer.latest_version(INDEX_DIR) is not None
+
+def load_index():
+    """
+    Indexed rows and their stamp. Uses the latest snapshot published by the
+    headless indexer (page loads then do no scanning at all); without one,
+    the inventory is scanned and indexed in-process as before.
+    """
+    version = None if IS_CLOUD else indexer.latest_version(INDEX_DIR)
+    if version is not None:
+        try:
+            with diagnostics.cache_lookup("load_index"):
+                return load_index_snapshot(INDEX_DIR, version)
+        except Exception as e:
+            st.warning(f"No se pudo leer el snapshot {version} del indexador ({e}); escaneando directamente.")
+
+    with st.spinner("Cargando repositorio..."), diagnostics.cache_lookup("scan_directory"):
+        raw_files, inventory_stamp = load_inventory(DATA_DIR, data_version("inventory"))
+    drive_map_stamp = data_version("drive_map")
+    with diagnostics.cache_lookup("load_drive_map"):
+        drive_map = load_drive_map(drive_map_stamp)
+    with diagnostics.cache_lookup("index_files"):
+        rows = index_in_process(raw_files, drive_map, inventory_stamp, drive_map_stamp)
+    return rows, (inventory_stamp, drive_map_stamp)
+
+@st.cache_resource
+def get_pdf_server(base_dir):
+    """Local file server for previews, started once per process."""
+    import pdf_server
+    return pdf_server.PdfServer(base_dir)
+
+@st.cache_resource
+def get_blob_cache():
+    """Local copies of Drive files (cloud mode), shared by all sessions."""
+    import blob_cache
+    return blob_cache.BlobCache(max_bytes=BLOB_CACHE_MAX_MB * 1024 ** 2)
+
+@contextlib.contextmanager
+def local_files(paths, errors=None):
+    """
+    Readable local paths of inventory Rutas, valid inside the with block. In the
+    cloud they are cached copies downloaded from Drive on first use (None where
+    one cannot be fetched), pinned so no other session's download evicts them
+    while they are read.
+    Failures are shown as a warning, or appended to `errors` to be reported by the caller.
+    """
+    if not IS_CLOUD:
+        yield list(paths)
+        return
+    drive_map = load_drive_map(data_version("drive_map"))
+    with contextlib.ExitStack() as pins:
+        result = []
+        for path in paths:
+            with diagnostics.span("blob_fetch"):
                 try:
-                    stat = os.stat(full_path)
-                    # Helper for strict creation date formatting
-                    dt_obj = datetime.fromtimestamp(stat.st_ctime)
-                    ctime = dt_obj.strftime("%A, %d de %B de %Y")
-                    # Capitalize first letter (Miércoles...)
-                    ctime = ctime.capitalize()
-                    
-                    mod_time = datetime.fromtimestamp(stat.st_mtime)
-                except:
-                    ctime = datetime.now().strftime("%A, %d de %B de %Y")
-                    mod_time = datetime.now()
-
-                final_date = date_folder if date_folder else datetime.now().strftime("%Y-%m-%d")
-                
-                ext = file.split('.')[-1].upper()
-                version = extract_version(file)
-                
-                raw_files.append({
-                    "ID": fid,
-                    "Proyecto": project,
-                    "Fecha": final_date,
-                    "FechaCreacion": ctime, # Formatted String
-                    "Responsable": person,
-                    "Documento": file,
-                    "Ext": ext,
-                    "Ruta": full_path,
-                    "ModTime": mod_time,
-                    "Versión": version
-                })
-                
-    return raw_files
-
-def get_pdf_metadata(file_path):
-    try:
-        reader = pypdf.PdfReader(file_path)
-        if reader.metadata and "/CreationDate" in reader.metadata:
-            d = reader.metadata["/CreationDate"]
-            if d.startswith("D:"): d = d[2:]
-            if len(d) >= 8: return datetime.strptime(d[:8], "%Y%m%d").strftime("%Y-%m-%d")
-    except: pass
-    return None
-
-def categorize_document(filename, path_context, description=""):
-    text = (filename + " " + path_context + " " + description).upper()
-    
-    # Priority Categories
-    if any(k in text for k in ["MEMORIA", "CALCULO", "MC", "DESIGN"]): return "Memorias"
-    if any(k in text for k in ["PROCESO", "CONSTRUCTIVO", "PROCEDIMIENTO", "MANUAL", "METODOLOGIA"]): return "Proceso Constructivo"
-    if any(k in text for k in ["GEOMETRICO", "TRAZO", "TOPOGRAFIA", "ALINEAMIENTO", "PERFIL"]): return "Geométrico"
-    if any(k in text for k in ["ODT", "ORDEN DE TRABAJO"]): return "ODT"
-
-    # Standard Categories
-    if any(k in text for k in ["CIMENTACION", "ZAPATA", "PILOTE", "TERRACERIA", "EXCAVACION"]): return "Subestructura"
-    if any(k in text for k in ["COLUMNA", "VIGA", "LOSA", "ACERO", "ESTRUCTURA", "MONTAJE", "TRABE", "CABALLETE", "NU 200", "NU-200", "CABEZAL"]): return "Superestructura"
-    if any(k in text for k in ["ARQUITECTURA", "ACABADO", "MURO", "FACHADA"]): return "Arquitectura"
-    
-    return "General"
-
-def generate_auto_description(file_path):
-    try:
-        reader = pypdf.PdfReader(file_path)
-        if len(reader.pages) > 0:
-            text = reader.pages[0].extract_text()
-            if not text: return ""
-            lines = [l.strip() for l in text.split('\n') if len(l.strip()) > 3]
-            keywords = ["CONTENIDO", "PLANO:", "PROYECTO:", "CONTIENE:", "TITULO:"]
-            summary = []
-            for line in lines:
-                for k in keywords:
-                    if k in line.upper():
-                        val = line.upper().split(k, 1)[-1].strip()
-                        if len(val) > 2: summary.append(f"{k.title()} {val}")
-            
-            if not summary:
-                 caps = [l for l in lines if l.isupper() and not l.replace(' ','').isdigit()]
-                 summary = caps[:3]
-            return " | ".join(summary[:4])
-    except: return ""
-    return ""
+                    result.append(pins.enter_context(get_blob_cache().pinned(drive_map.get(path))))
+                except Exception as e:
+                    if errors is None: st.warning(f"No se pudo descargar {path}: {e}")
+                    else: errors.append(f"{path}: {e}")
+                    result.append(None)
+        yield result
 
 def open_file_system(path):
     if IS_CLOUD:
@@ -494,174 +466,279 @@ def open_folder_select(path):
         return False, str(e)
 
 # --- Optimized Data Processing ---
-@st.cache_data(show_spinner=False)
-def build_dataframe(raw_files, notes_db, drive_map):
-    full_data = []
-    
-    for f in raw_files:
-        # Get DB data directly (notes_db is just a dict)
-        db_entry = notes_db.get(f["ID"], {})
-        if isinstance(db_entry, str): db_entry = {"notes": db_entry} # Compat
-        
-        # Defaults
-        status = db_entry.get("status", "Pendiente")
-        notes = db_entry.get("notes", "")
-        desc = db_entry.get("description", "")
-        reviewed = db_entry.get("reviewed", False) # New field
-        
-        # Auto-Category
-        cat = categorize_document(f["Documento"], f["Ruta"], desc)
-        # Sub-Category
-        subcat = extract_subcategory(f["Documento"], cat)
-        
-        # Drive Link
-        drive_link = find_drive_link(f["Documento"], f["Proyecto"], drive_map)
-
-        # Base Name for Version Grouping
-        base_name = extract_base_name(f["Documento"])
-        
-        # Numeric Version for Sorting
-        ver_str = f["Versión"] 
-        try:
-            ver_num = int(ver_str[1:])
-        except:
-            ver_num = 1
-
-        # Build complete row
-        row = f.copy()
-        row.update({
-            "Ver": False,
-            "Revisado": reviewed,
-            "Estado": status,
-            "Notas": notes,
-            "Descripción": desc,
-            "Categoría": cat,
-            "Subcategoría": subcat,
-            "DriveLink": drive_link,
-            "BaseName": base_name,
-            "VersionNum": ver_num
-        })
-        full_data.append(row)
-    
-    return pd.DataFrame(full_data)
+@st.cache_resource(show_spinner=False, max_entries=4)
+def build_dataframe(_rows, _notes_db, index_stamp, notes_stamp):
+    """
+    Cached inventory.merge_notes of the indexed rows and the notes.
+    The underscored inputs are not hashed by Streamlit; the cache is keyed by
+    the two stamps, which must change whenever the matching input changes.
+    The frame is shared by all sessions (cache_resource): never modify it in place.
+    """
+    diagnostics.miss("build_dataframe")
+    return inventory.merge_notes(_rows, _notes_db)
+
+# --- Aggregate Layer ---
+# The management dashboard renders from counts per combination of these
+# dimensions (a few hundred cells) instead of from the raw rows.
+AGG_DIMENSIONS = ["Proyecto", "Categoría", "Subcategoría", "Estado", "Revisado", "Fecha", "Ext"]
+AGG_STORE_SIZE = 8
+
+def build_aggregates(df):
+    """Single groupby: {dimension tuple: count} (only combinations that occur)."""
+    if df.empty: return {}
+    return df.groupby(AGG_DIMENSIONS, dropna=False, observed=True).size().to_dict()
+
+def aggregate_dims(row):
+    """Dimension tuple of a single document row (same key as build_aggregates)."""
+    return tuple(bool(row[d]) if d == "Revisado" else row[d] for d in AGG_DIMENSIONS)
+
+def aggregates_frame(agg):
+    return pd.DataFrame(
+        [(*dims, count) for dims, count in agg.items()],
+        columns=AGG_DIMENSIONS + ["Cantidad"]
+    )
+
+@st.cache_resource
+def get_aggregate_store():
+    """Process-wide aggregate tables keyed by (index, notes) stamps."""
+    return {"lock": threading.Lock(), "tables": {}}
+
+def _store_aggregates(key, agg):
+    store = get_aggregate_store()
+    with store["lock"]:
+        store["tables"][key] = agg
+        while len(store["tables"]) > AGG_STORE_SIZE:
+            store["tables"].pop(next(iter(store["tables"])))
+
+def get_aggregates(df, key):
+    store = get_aggregate_store()
+    with store["lock"]:
+        agg = store["tables"].get(key)
+    if agg is None:
+        diagnostics.miss("aggregates")
+        agg = build_aggregates(df)
+        _store_aggregates(key, agg)
+    return agg
+
+def update_aggregates(old_key, new_key, deltas):
+    """
+    Derives the table for new_key from old_key by moving one count per
+    changed document. deltas: list of (old dims, new dims).
+    If old_key is not stored, nothing is done (next read rebuilds it).
+    """
+    store = get_aggregate_store()
+    with store["lock"]:
+        agg = store["tables"].get(old_key)
+    if agg is None: return
+    agg = dict(agg)
+    for old_dims, new_dims in deltas:
+        if old_dims == new_dims: continue
+        agg[old_dims] = agg.get(old_dims, 0) - 1
+        if agg[old_dims] <= 0: del agg[old_dims]
+        agg[new_dims] = agg.get(new_dims, 0) + 1
+    _store_aggregates(new_key, agg)
+
+# --- Search Index ---
+SEARCH_FIELDS = ["Documento", "Responsable", "Descripción", "Notas"]
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def get_search_index(_df, index_stamp, notes_stamp):
+    """
+    Trigram index over the unfiltered frame (row i <-> index label i),
+    rebuilt only when one of the stamps changes.
+    """
+    diagnostics.miss("search_index")
+    import search_index
+    texts = _df[SEARCH_FIELDS].astype(object).fillna("").astype(str).agg(" ".join, axis=1)
+    return search_index.TrigramIndex(texts.tolist())
 
 # --- App Loading ---
 
 # HEADER SECTION
-c_logo, c_title = st.columns([1, 6])
-with c_logo:
-    # Try to load local logo (JPEG)
-    logo_path = "Logo F12.jpg"
+@st.cache_resource
+def load_logo_b64(logo_path):
+    """Static asset: read and base64-encode the logo once per process."""
+    with open(logo_path, "rb") as f:
+        return base64.b64encode(f.read()).decode()
+
+def show_header():
+    c_logo, c_title = st.columns([1, 6])
+    with c_logo:
+        # Try to load local logo (JPEG)
+        logo_path = "Logo F12.jpg"
     
-    if os.path.exists(logo_path):
-        # We need to render it as a circle using HTML/CSS because st.image is rectangular
-        # Read and encode image
-        try:
-            with open(logo_path, "rb") as f:
-                img_data = f.read()
-            encoded_img = base64.b64encode(img_data).decode()
+        if os.path.exists(logo_path):
+            # We need to render it as a circle using HTML/CSS because st.image is rectangular
+            # Read and encode image (once per process)
+            try:
+                encoded_img = load_logo_b64(logo_path)
             
-            st.markdown(
-                f"""
-                <style>
-                    .logo-container {{
-                        display: flex;
-                        justify-content: center;
-                        align-items: center;
-                    }}
-                    img.logo-circular {{
-                        border-radius: 50%;
-                        width: 90px;
-                        height: 90px;
-                        object-fit: cover;
-                        border: 3px solid #E3F2FD;
-                        box-shadow: 0 4px 6px rgba(0,0,0,0.1);
-                        transition: transform 0.3s ease;
-                    }}
-                    img.logo-circular:hover {{
-                        transform: scale(1.05) rotate(5deg);
-                    }}
-                </style>
-                <div class="logo-container">
-                    <img src="data:image/jpeg;base64,{encoded_img}" class="logo-circular">
-                </div>
-                """, 
-                unsafe_allow_html=True
-            )
-        except Exception as e:
-            st.error(f"Error cargando logo: {e}")
-    else:
-        st.markdown("# 🚄") # Fallback icon
-
-with c_title:
-    st.markdown("""
-        <div style="padding-top: 15px;">
-            <h1 style="margin:0; font-size: 2.5rem; color: #0F172A; text-transform: uppercase; letter-spacing: -1px;">
-                Frente 12 <span style="color: #132B4F; font-weight: 300;">| Control Documental</span>
-            </h1>
-            <p style="margin:0; color: #64748B; font-size: 1rem; font-family: 'Inter';">
-                Tablero de Gestión de Proyectos Ferroviarios
-            </p>
-        </div>
-    """, unsafe_allow_html=True)
-
+                st.markdown(
+                    f"""
+                    <style>
+                        .logo-container {{
+                            display: flex;
+                            justify-content: center;
+                            align-items: center;
+                        }}
+                        img.logo-circular {{
+                            border-radius: 50%;
+                            width: 90px;
+                            height: 90px;
+                            object-fit: cover;
+                            border: 3px solid #E3F2FD;
+                            box-shadow: 0 4px 6px rgba(0,0,0,0.1);
+                            transition: transform 0.3s ease;
+                        }}
+                        img.logo-circular:hover {{
+                            transform: scale(1.05) rotate(5deg);
+                        }}
+                    </style>
+                    <div class="logo-container">
+                        <img src="data:image/jpeg;base64,{encoded_img}" class="logo-circular">
+                    </div>
+                    """, 
+                    unsafe_allow_html=True
+                )
+            except Exception as e:
+                st.error(f"Error cargando logo: {e}")
+        else:
+            st.markdown("# 🚄") # Fallback icon
+
+    with c_title:
+        st.markdown("""
+            <div style="padding-top: 15px;">
+                <h1 style="margin:0; font-size: 2.5rem; color: #0F172A; text-transform: uppercase; letter-spacing: -1px;">
+                    Frente 12 <span style="color: #132B4F; font-weight: 300;">| Control Documental</span>
+                </h1>
+                <p style="margin:0; color: #64748B; font-size: 1rem; font-family: 'Inter';">
+                    Tablero de Gestión de Proyectos Ferroviarios
+                </p>
+            </div>
+        """, unsafe_allow_html=True)
+
+show_header()
 st.divider()
 
 st.sidebar.title("🎛️ Panel de Control")
 
-# 1. Load Data (Cached)
-with st.spinner("Cargando repositorio..."):
-    raw_files = scan_directory(DATA_DIR)
+# 1. Load Data (Cached, shared by all sessions; treat as read-only)
+# Indexed inventory: the indexer's latest snapshot, or an in-process scan + Drive merge
+index_rows, index_stamp = load_index()
 
-# 2. Merge with DB and Drive Map using Session State
-if 'notes_db' not in st.session_state:
-    st.session_state['notes_db'] = load_notes()
+# 2. Merge with the shared notes snapshot
+# Sessions only keep their own filters/selections in st.session_state
+with diagnostics.cache_lookup("load_notes"):
+    # Also picks up descriptions written by the indexer process
+    notes_snapshot = get_notes_store().refresh()
+notes_db = notes_snapshot.data
 
-# Access data via session state
-notes_db = st.session_state['notes_db']
-drive_map = load_drive_map()
+# Build Dataframe (Cached Processing, keyed by stamps)
+with diagnostics.cache_lookup("build_dataframe"):
+    df = build_dataframe(index_rows, notes_db, index_stamp, notes_snapshot.stamp)
+diagnostics.set_rows("inventory", len(index_rows))
+diagnostics.set_rows("notes", len(notes_db))
+diagnostics.set_rows("dataframe", len(df))
 
-# Build Dataframe (Cached Processing)
-df = build_dataframe(raw_files, notes_db, drive_map)
+# Aggregate table for the management dashboard (same stamps)
+def agg_key(notes_stamp):
+    return (index_stamp, notes_stamp)
+
+with diagnostics.cache_lookup("aggregates"):
+    agg_df = aggregates_frame(get_aggregates(df, agg_key(notes_snapshot.stamp)))
 
 # --- Interaction Handlers ---
 
 # Sidebar Actions
+# In the cloud every PDF is a Drive download, so a click analyzes at most this
+# many (the next click continues with the rest). Bulk runs belong to the indexer.
+CLOUD_ANALYZE_BATCH = 25
+
 if st.sidebar.button("✨ Analizar PDFs (IA)"):
+    todo = df[(df["Ext"] == "PDF") & (df["Descripción"].fillna("") == "")].to_dict("records")
+    if IS_CLOUD:
+        # Tried already in this session (no text or failed download): not fetched again on every click
+        tried = st.session_state.setdefault("analyzed_ids", set())
+        todo = [row for row in todo if row["ID"] not in tried][:CLOUD_ANALYZE_BATCH]
     progress_bar = st.sidebar.progress(0)
     count = 0
-    total = len(df[df["Ext"] == "PDF"])
+    failed = []
+    changes = {}
     
-    for idx, row in df.iterrows():
-        if row["Ext"] == "PDF" and not row["Descripción"]:
-            new_desc = generate_auto_description(row["Ruta"])
+    with diagnostics.span("pdf_parsing"):
+        for done, row in enumerate(todo, start=1):
+            with local_files([row["Ruta"]], failed) as (path,):
+                new_desc = inventory.generate_auto_description(path) if path else None
+            if IS_CLOUD: tried.add(row["ID"])
             if new_desc:
                 # Update DB
-                fid = row["ID"]
-                current = notes_db.get(fid, {})
-                if isinstance(current, str): current = {"notes": current}
-                current["description"] = new_desc
-                notes_db[fid] = current
+                changes[row["ID"]] = {"description": ("", new_desc)}
                 count += 1
-            if total > 0: progress_bar.progress(count / total)
+            progress_bar.progress(done / len(todo))
             
-    # Save to session and disk
-    st.session_state['notes_db'] = notes_db
-    save_notes(notes_db)
-    st.cache_data.clear() # Clear cache to refresh dataframe
+    # Publish and save (descriptions can change categories: aggregates are rebuilt)
+    commit_notes(changes)
+    # Shown after the rerun
+    st.session_state["analyze_report"] = (count, failed)
+    rerun_app()
+
+analyze_report = st.session_state.pop("analyze_report", None)
+if analyze_report:
+    count, failed = analyze_report
     st.sidebar.success(f"Analizados {count} documentos.")
-    st.rerun()
+    if failed:
+        st.sidebar.warning(f"{len(failed)} PDFs no se pudieron descargar de Drive (p. ej. {failed[0]}).")
+
+st.sidebar.divider()
+
+# Pull Notes Action (only what changed in Supabase since the last pull)
+if st.sidebar.button("⬇️ Traer Notas de la Nube"):
+    supabase = get_supabase()
+    if supabase is None:
+        st.sidebar.error("Sincronización con Supabase no disponible.")
+    else:
+        with st.spinner("Trayendo cambios..."), diagnostics.span("supabase_pull"):
+            try:
+                import supabase_sync
+                applied, kept = supabase.pull(get_notes_store(), supabase_sync.PULL_STATE_FILE)
+            except Exception as e:
+                st.sidebar.error(f"Error trayendo notas: {e}")
+                applied = kept = None
+        if applied is not None:
+            if applied: invalidate("notes")
+            st.sidebar.success(f"{len(applied)} documentos actualizados.")
+            if kept: st.sidebar.caption(f"{len(kept)} conservan un cambio local más reciente.")
+            if applied: rerun_app()
 
 st.sidebar.divider()
 
+# Rescan Action: new or moved files show up without waiting for CACHE_TTL
+if not IS_CLOUD and st.sidebar.button("🔁 Reescanear Repositorio"):
+    if snapshot_mode():
+        st.sidebar.info("El indexador publicará los archivos nuevos en su próxima pasada.")
+    else:
+        invalidate("inventory")
+        rerun_app()
+
 # Refresh Drive Map Action
 if st.sidebar.button("🔄 Refrescar Mapa Drive"):
     with st.spinner("Conectando a Drive..."):
         try:
+            before = indexer.drive_map_fingerprint(load_drive_map(data_version("drive_map")))
             subprocess.run(["python", "drive_service.py"], check=True)
-            st.cache_data.clear()
-            st.success("Mapa de Drive actualizado!")
-            st.rerun()
+            with open(DRIVE_MAP_FILE, "r", encoding="utf-8") as f:
+                after = indexer.drive_map_fingerprint(json.load(f))
+            # Entries carry modifiedTime/md5Checksum: an unchanged stamp means no file changed
+            if after == before:
+                st.info("Drive sin cambios.")
+            elif snapshot_mode():
+                # Links come from the indexer's snapshot: it reads the new map on its next pass
+                invalidate("drive_map")
+                st.info("Mapa de Drive actualizado. Los links se verán tras la próxima pasada del indexador.")
+            else:
+                invalidate("drive_map")
+                st.success("Mapa de Drive actualizado!")
+                rerun_app()
         except Exception as e:
             st.error(f"Error actualizando Drive: {e}")
 
@@ -669,41 +746,112 @@ st.sidebar.divider()
 
 # Filters
 if not df.empty:
-    sel_proj = st.sidebar.multiselect("Filtrar Proyecto", df["Proyecto"].unique())
-    sel_cat = st.sidebar.multiselect("Filtrar Categoría", df["Categoría"].unique())
+    # Options come from the aggregate table (no scan over the rows)
+    sel_proj = st.sidebar.multiselect("Filtrar Proyecto", sorted(agg_df["Proyecto"].unique()))
+    sel_cat = st.sidebar.multiselect("Filtrar Categoría", sorted(agg_df["Categoría"].unique()))
     sel_stat = st.sidebar.multiselect("Filtrar Estado", ["Pendiente", "En Revisión", "Aprobado", "Rechazado"])
     
     filter_reviewed = st.sidebar.checkbox("Ocultar Revisados", value=False)
     
     # Extension Filter
     ext_filter = st.sidebar.radio("Tipo de Archivo", ["Todos", "PDF", "DWG"], horizontal=True)
-    if ext_filter == "PDF": df = df[df["Ext"] == "PDF"]
-    elif ext_filter == "DWG": df = df[df["Ext"] == "DWG"]
 
-    if sel_proj: df = df[df["Proyecto"].isin(sel_proj)]
-    if sel_cat: df = df[df["Categoría"].isin(sel_cat)]
-    if sel_stat: df = df[df["Estado"].isin(sel_stat)]
-    if filter_reviewed: df = df[df["Revisado"] == False]
+    def apply_filters(frame):
+        # Works on both the document rows and the aggregate table
+        if ext_filter == "PDF": frame = frame[frame["Ext"] == "PDF"]
+        elif ext_filter == "DWG": frame = frame[frame["Ext"] == "DWG"]
+
+        if sel_proj: frame = frame[frame["Proyecto"].isin(sel_proj)]
+        if sel_cat: frame = frame[frame["Categoría"].isin(sel_cat)]
+        if sel_stat: frame = frame[frame["Estado"].isin(sel_stat)]
+        if filter_reviewed: frame = frame[frame["Revisado"] == False]
+        return frame
+
+    # Built before filtering so index positions match the full frame's labels
+    full_df = df
+    with diagnostics.span("filters"):
+        df = apply_filters(df)
+        agg_df = apply_filters(agg_df)
 
-    search = st.sidebar.text_input("🔍 Buscar Documento")
+    search = st.sidebar.text_input("🔍 Buscar Documento", help="Nombre, responsable, descripción o notas. Varias palabras = todas deben aparecer.")
     if search:
-        df = df[df["Documento"].str.contains(search, case=False) | df["Responsable"].str.contains(search, case=False)]
+        with diagnostics.cache_lookup("search_index"):
+            index = get_search_index(full_df, index_stamp, notes_snapshot.stamp)
+        with diagnostics.span("search"):
+            matches = index.search(search)
+            if matches is not None:
+                df = df.loc[df.index.intersection(pd.Index(matches), sort=False)]
+                # Text search is row-level: aggregate the matching rows instead
+                agg_df = aggregates_frame(build_aggregates(df))
+    diagnostics.set_rows("filtered", len(df))
 
 # --- Interface Tabs ---
+# Each tab runs as an isolated fragment: interacting with a widget inside one
+# section reruns only that section, not the whole script.
+# Try to obtain fragment decorator for isolation
+try:
+    if hasattr(st, "fragment"):
+        section_fragment = st.fragment
+    elif hasattr(st, "experimental_fragment"):
+        section_fragment = st.experimental_fragment
+    else:
+        # Fallback: simple decorator (no fragment, full reload on change)
+        def section_fragment(func):
+            return func
+except:
+    def section_fragment(func):
+        return func
+
+def traced_section(name):
+    """
+    Times a section under `name`. A fragment rerun happens after the full
+    run's trace was closed, so it gets (and logs) a trace of its own.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            own = diagnostics.current() is None
+            if own: diagnostics.start("fragment", st.session_state.get("diag_session"))
+            try:
+                with diagnostics.span(name):
+                    return func(*args, **kwargs)
+            except BaseException:
+                # st.rerun()/st.stop() or an error: the end of the script is never reached
+                remember_diagnostics(diagnostics.finish())
+                raise
+            finally:
+                if own: remember_diagnostics(diagnostics.finish())
+        return wrapper
+    return decorator
+
+def rerun_section():
+    """Reruns only the current fragment when supported, else the whole app."""
+    try:
+        st.rerun(scope="fragment")
+    except TypeError:
+        st.rerun()
 
 tab1, tab2, tab3 = st.tabs(["📊 Dashboard Gerencial", "📂 Explorador de Documentos", "⚖️ Comparador de Versiones"])
 
 # TAB 1: DASHBOARD
-with tab1:
-    if df.empty:
+@section_fragment
+@traced_section("tab_gerencial")
+def show_management(df, agg_df):
+    """Metrics and charts render from the aggregate table; rows are only used for drill-down."""
+    if agg_df.empty:
         st.info("No hay datos para mostrar.")
     else:
+        import altair as alt # Charts only: not needed until this tab renders data
+        def count_by(column):
+            return agg_df.groupby(column, observed=True)["Cantidad"].sum().sort_values(ascending=False).reset_index()
+        
         # Top Metrics
+        cantidad = agg_df["Cantidad"]
         c1, c2, c3, c4 = st.columns(4)
-        c1.metric("Total Documentos", len(df), delta=f"{len(df[df['Fecha'] == datetime.now().strftime('%Y-%m-%d')])} hoy")
-        c2.metric("Pendientes", len(df[df["Estado"] == "Pendiente"]), delta_color="off")
-        c3.metric("Aprobados", len(df[df["Estado"] == "Aprobado"]), delta_color="normal")
-        c4.metric("Por Revisar", len(df[df["Revisado"] == False]), delta_color="inverse")
+        c1.metric("Total Documentos", int(cantidad.sum()), delta=f"{int(cantidad[agg_df['Fecha'] == pd.Timestamp.now().normalize()].sum())} hoy")
+        c2.metric("Pendientes", int(cantidad[agg_df["Estado"] == "Pendiente"].sum()), delta_color="off")
+        c3.metric("Aprobados", int(cantidad[agg_df["Estado"] == "Aprobado"].sum()), delta_color="normal")
+        c4.metric("Por Revisar", int(cantidad[agg_df["Revisado"] == False].sum()), delta_color="inverse")
         
         st.divider()
         
@@ -714,8 +862,7 @@ with tab1:
             st.subheader("Documentos por Proyecto")
             
             # Group by Project
-            proj_counts = df["Proyecto"].value_counts().reset_index()
-            proj_counts.columns = ["Proyecto", "Cantidad"]
+            proj_counts = count_by("Proyecto")
             
             # Horizontal Bar Chart
             c_proj = alt.Chart(proj_counts).mark_bar().encode(
@@ -730,8 +877,7 @@ with tab1:
             st.markdown("---")
             st.subheader("Documentos por Disciplina")
             # Bar chart of Categoría
-            chart_data = df["Categoría"].value_counts().reset_index()
-            chart_data.columns = ["Categoría", "Cantidad"]
+            chart_data = count_by("Categoría")
             
             c_cat = alt.Chart(chart_data).mark_bar().encode(
                  x=alt.X('Categoría', sort='-y'),
@@ -742,8 +888,7 @@ with tab1:
             
         with col_charts_2:
             st.subheader("Estado de Aprobación")
-            status_counts = df["Estado"].value_counts().reset_index()
-            status_counts.columns = ["Estado", "Cantidad"]
+            status_counts = count_by("Estado")
             
             # Interactive Selection Definition
             # We use a point selection bound to the 'Estado' field using a specific name
@@ -784,6 +929,7 @@ with tab1:
                     column_config={
                         "Documento": st.column_config.TextColumn("Documento", width="medium"),
                         "Proyecto": st.column_config.TextColumn("Proyecto", width="small"),
+                        "Fecha": st.column_config.DateColumn("Fecha", format="YYYY-MM-DD", width="small"),
                         "DriveLink": st.column_config.LinkColumn("☁️", display_text="Ver"),
                     },
                     hide_index=True,
@@ -797,9 +943,8 @@ with tab1:
 
         st.subheader("Desglose por Tipo de Elemento (Subcategoría)")
         
-        if "Subcategoría" in df.columns:
-            subcat_counts = df["Subcategoría"].value_counts().reset_index()
-            subcat_counts.columns = ["Subcategoría", "Cantidad"]
+        if "Subcategoría" in agg_df.columns:
+            subcat_counts = count_by("Subcategoría")
             
             c_sub = alt.Chart(subcat_counts).mark_bar().encode(
                 x=alt.X('Cantidad', title='Número de Documentos'),
@@ -815,9 +960,12 @@ with tab1:
         # --- NEW TIMELINE SECTION ---
         st.subheader("📅 Cronograma de Actividad (Entregas)")
         
-        if not df.empty:
-            # Prepare Data for Layout
-            source = df.copy()
+        if not agg_df.empty:
+            # Prepare Data for Layout: counts per (Fecha, Proyecto) + most frequent Estado
+            by_state = agg_df.groupby(["Fecha", "Proyecto", "Estado"], observed=True)["Cantidad"].sum().reset_index()
+            source = by_state.groupby(["Fecha", "Proyecto"], observed=True)["Cantidad"].sum().reset_index()
+            top_state = by_state.sort_values("Cantidad", ascending=False).drop_duplicates(subset=["Fecha", "Proyecto"])
+            source = source.merge(top_state[["Fecha", "Proyecto", "Estado"]], on=["Fecha", "Proyecto"], how="left")
             # Ensure proper datetime format
             source["Fecha_DT"] = pd.to_datetime(source["Fecha"], errors='coerce')
             source = source.dropna(subset=["Fecha_DT"])
@@ -827,12 +975,12 @@ with tab1:
             timeline = alt.Chart(source).mark_rect(cornerRadius=4).encode(
                 x=alt.X('yearmonthdate(Fecha_DT):O', title='Fecha de Entrega', axis=alt.Axis(labelAngle=-45, format='%d %b')),
                 y=alt.Y('Proyecto:N', title=None),
-                color=alt.Color('count()', title='Docs', scale=alt.Scale(scheme='lightgreyteal')),
+                color=alt.Color('sum(Cantidad):Q', title='Docs', scale=alt.Scale(scheme='lightgreyteal')),
                 tooltip=[
                     alt.Tooltip('yearmonthdate(Fecha_DT):T', title='Fecha', format='%d %b %Y'),
                     alt.Tooltip('Proyecto:N'),
-                    alt.Tooltip('count()', title='Total Documentos'),
-                    alt.Tooltip('Estado:N', title='Estado Predominante') # Just simplistic
+                    alt.Tooltip('sum(Cantidad):Q', title='Total Documentos'),
+                    alt.Tooltip('Estado:N', title='Estado Predominante')
                 ]
             ).properties(
                 height=350,
@@ -851,22 +999,15 @@ with tab1:
             st.caption("💡 Este mapa de calor muestra qué días hubo mayor actividad de recepción de documentos en cada proyecto.")
 
 
+with tab1:
+    show_management(df, agg_df)
+
 # TAB 2: EXPLORER FRAGMENT
-# Try to obtain fragment decorator for isolation
-try:
-    if hasattr(st, "fragment"):
-        explorer_fragment = st.fragment
-    elif hasattr(st, "experimental_fragment"):
-        explorer_fragment = st.experimental_fragment
-    else:
-        # Fallback: simple decorator (no fragment, full reload on change)
-        def explorer_fragment(func):
-            return func
-except:
-    def explorer_fragment(func):
-        return func
+EXPLORER_PAGE_SIZES = [25, 50, 100, 250, 500]
+EXPLORER_DEFAULT_PAGE_SIZE = 100
 
-@explorer_fragment
+@section_fragment
+@traced_section("tab_explorador")
 def show_explorer(df):
     if df.empty:
         st.warning("No se encontraron documentos.")
@@ -880,6 +1021,14 @@ def show_explorer(df):
     # No, radio handles itself usually.
     view_mode = c_head_2.radio("Modo", ["📊 Resumida", "✏️ Detallada"], horizontal=True, label_visibility="collapsed")
     
+    # Report fields that were not saved because another reviewer changed them first
+    conflicts = st.session_state.pop('notes_conflicts', [])
+    if conflicts:
+        st.warning(
+            f"⚠️ {len(conflicts)} cambios no se guardaron porque otro usuario modificó el mismo campo:\n\n" +
+            "\n".join(f"- **{c.fid}** · {c.field}: actual «{c.stored}», tuyo «{c.yours}»" for c in conflicts[:20])
+        )
+
     # Placeholder for Save Button
     save_clicked = False
     if view_mode == "✏️ Detallada":
@@ -890,135 +1039,147 @@ def show_explorer(df):
             if row.get("DriveLink"): return row["DriveLink"]
             return None
 
+    def display_frame(frame):
+        """
+        Render-time copy of a page: categoricals as plain text (so the editor's
+        selectbox accepts any option) and FechaCreacion formatted in Spanish.
+        page_df itself stays typed: its values are the aggregate keys.
+        """
+        frame = frame.copy()
+        for c in frame.columns:
+            if isinstance(frame[c].dtype, pd.CategoricalDtype):
+                frame[c] = frame[c].astype(object)
+        if "FechaCreacion" in frame.columns:
+            frame["FechaCreacion"] = frame["FechaCreacion"].dt.strftime("%A, %d de %B de %Y").str.capitalize().fillna("")
+        return frame
+
     def style_status(val):
         if val == "Aprobado": return 'background-color: #d1fae5; color: #065f46; font-weight: 600; border-radius: 4px;' 
         elif val == "Rechazado": return 'background-color: #fee2e2; color: #991b1b; font-weight: 600; border-radius: 4px;' 
         elif val == "En Revisión": return 'background-color: #dbeafe; color: #1e40af; font-weight: 600; border-radius: 4px;' 
         return ''
 
-    # Unique Categories (Sorted)
-    cats = sorted(df["Categoría"].unique())
-    tabs = st.tabs([f"🔹 {cat}" for cat in cats])
+    # Unique Categories (Sorted). Only the active category/page is materialized.
+    # Categoricals count every category; keep only the ones present
+    cat_counts = df["Categoría"].value_counts()
+    cat_counts = cat_counts[cat_counts > 0]
+    cats = sorted(cat_counts.index)
+    if st.session_state.get("explorer_cat") not in cats:
+        st.session_state["explorer_cat"] = cats[0]
+    cat = st.radio(
+        "Categoría", cats, horizontal=True, key="explorer_cat",
+        format_func=lambda c: f"🔹 {c} ({cat_counts[c]})", label_visibility="collapsed"
+    )
+    cat_df = df[df["Categoría"] == cat]
+
+    # Logic Breakdown: If "Superestructura", we subdivide by Subcategoría
+    sub = None
+    if cat == "Superestructura":
+        sub_counts = cat_df["Subcategoría"].value_counts()
+        sub_counts = sub_counts[sub_counts > 0]
+        subcats = sorted(sub_counts.index)
+        sub = st.selectbox(
+            "🏗️ Tipo de Elemento", subcats, key="explorer_sub",
+            format_func=lambda s: f"{s.upper()} ({sub_counts[s]})"
+        )
+        cat_df = cat_df[cat_df["Subcategoría"] == sub]
+
+    if view_mode == "📊 Resumida":
+        page_source = cat_df.sort_values(by=["ID"])
+    else:
+        # Edit Mode: latest version of each document only
+        page_source = cat_df.sort_values(by=["Proyecto", "BaseName", "VersionNum"], ascending=[True, True, False])
+        page_source = page_source.drop_duplicates(subset=["Proyecto", "BaseName"], keep="first")
+
+    # Pagination
+    c_page_1, c_page_2, c_page_3 = st.columns([2, 1, 1])
+    page_size = c_page_3.selectbox(
+        "Filas por página", EXPLORER_PAGE_SIZES,
+        index=EXPLORER_PAGE_SIZES.index(EXPLORER_DEFAULT_PAGE_SIZE), key="explorer_page_size"
+    )
+    n_pages = max(1, -(-len(page_source) // page_size))
+    page_key = f"explorer_page_{cat}_{sub}"
+    if st.session_state.get(page_key, 1) > n_pages:
+        st.session_state[page_key] = n_pages
+    page = c_page_2.number_input("Página", min_value=1, max_value=n_pages, value=1, step=1, key=page_key)
     
+    page_start = (page - 1) * page_size
+    page_df = page_source.iloc[page_start:page_start + page_size].copy()
+    c_page_1.caption(f"Total documentos: {len(page_source)} · Mostrando {page_start + 1 if len(page_df) else 0}–{page_start + len(page_df)} (página {page} de {n_pages})")
+
     # Store editors to process updates later
     editors_db = {} 
 
-    for cat, tab in zip(cats, tabs):
-        with tab:
-            # Filter Data
-            cat_df = df[df["Categoría"] == cat].copy()
-            if cat_df.empty:
-                st.info("No hay documentos en esta categoría.")
-                continue
-            
-            # Metric
-            st.caption(f"Total documentos: {len(cat_df)}")
-
-            # Logic Breakdown: If "Superestructura", we subdivide by Subcategoría
-            if cat == "Superestructura":
-                    # Get Subcategories
-                    subcats = sorted(cat_df["Subcategoría"].unique())
-                    
-                    for sub in subcats:
-                        sub_df = cat_df[cat_df["Subcategoría"] == sub].copy()
-                        if sub_df.empty: continue
-                        
-                        # Sub-Header Bar
-                        st.markdown(f"""
-                        <div style="background-color: #E2E8F0; color: #1e293b; padding: 5px 10px; border-radius: 4px; font-weight: 600; margin-top: 15px; margin-bottom: 5px; font-size: 0.9em; border-left: 4px solid #3b82f6;">
-                            🏗️ {sub.upper()} <span style="font-weight:400; font-size:0.9em;">({len(sub_df)})</span>
-                        </div>
-                        """, unsafe_allow_html=True)
-                        
-                        # Render Tables
-                        if view_mode == "📊 Resumida":
-                            view_df = sub_df.sort_values(by=["ID"]).copy()
-                            view_df["LinkURL"] = view_df.apply(make_link, axis=1)
-                            # COLS: Added Responsable
-                            cols = ["Proyecto", "Documento", "LinkURL", "Responsable", "Estado", "Fecha", "Notas"]
-                            for c in cols:
-                                if c not in view_df.columns: view_df[c] = ""
-                            view_df = view_df[cols]
-                            styled_df = view_df.style.map(style_status, subset=["Estado"])
-                            
-                            st.dataframe(
-                                styled_df, 
-                                column_config={
-                                    "LinkURL": st.column_config.LinkColumn("Link", display_text="☁️", width="small"),
-                                    "Responsable": st.column_config.TextColumn("Resp.", width="small")
-                                },
-                                use_container_width=True, 
-                                hide_index=True
-                            )
-                        else:
-                            # Edit Mode
-                            sub_df = sub_df.sort_values(by=["Proyecto", "BaseName", "VersionNum"], ascending=[True, True, False])
-                            sub_df = sub_df.drop_duplicates(subset=["Proyecto", "BaseName"], keep="first")
-                            
-                            ed = st.data_editor(
-                                sub_df[["Ver", "Revisado", "Estado", "Proyecto", "Fecha", "Documento", "Versión", "DriveLink", "Responsable", "Notas", "ID", "Ruta", "Descripción", "Ext", "Categoría", "Subcategoría", "FechaCreacion"]],
-                                column_config={
-                                    "ID": None, "Ruta": None, "Ext": None, "Descripción": None, "Categoría": None, "Subcategoría": None,
-                                    "Versión": None, "Fecha": st.column_config.TextColumn("Fecha", width="small", disabled=True),
-                                    "Ver": st.column_config.CheckboxColumn("👁️", width="small", default=False),
-                                    "Revisado": st.column_config.CheckboxColumn("Ok", width="small", default=False),
-                                    "Estado": st.column_config.SelectboxColumn("Estado", options=["Pendiente", "En Revisión", "Aprobado", "Rechazado", "Obsoleto"], required=True, width="medium"),
-                                    "Proyecto": st.column_config.TextColumn(width="small", disabled=True),
-                                    "Documento": st.column_config.TextColumn(width="large", disabled=True),
-                                    "DriveLink": st.column_config.LinkColumn("Link", display_text="☁️", width="small"),
-                                    "Responsable": st.column_config.TextColumn("Resp.", width="small", disabled=True),
-                                    "FechaCreacion": st.column_config.TextColumn("Creado el", width="small", disabled=True),
-                                    "Notas": st.column_config.TextColumn("Notas", width="medium"),
-                                },
-                                hide_index=True, use_container_width=True, key=f"editor_{cat}_{sub}"
-                            )
-                            editors_db[f"{cat}_{sub}"] = ed
-            else:
-                    # Normal Rendering for other Categories
-                    if view_mode == "📊 Resumida":
-                        view_df = cat_df.sort_values(by=["ID"]).copy()
-                        view_df["LinkURL"] = view_df.apply(make_link, axis=1)
-                        # COLS: Added Responsable
-                        cols = ["Proyecto", "Documento", "LinkURL", "Responsable", "Estado", "Fecha", "Notas"]
-                        for c in cols:
-                            if c not in view_df.columns: view_df[c] = ""
-                        view_df = view_df[cols]
-                        
-                        styled_df = view_df.style.map(style_status, subset=["Estado"])
-                        
-                        st.dataframe(
-                            styled_df, 
-                            column_config={
-                                "LinkURL": st.column_config.LinkColumn("Link", display_text="☁️", width="small"),
-                                "Responsable": st.column_config.TextColumn("Resp.", width="small")
-                            },
-                            use_container_width=True, 
-                            hide_index=True
-                        )
-                    else:
-                        cat_df = cat_df.sort_values(by=["Proyecto", "BaseName", "VersionNum"], ascending=[True, True, False])
-                        cat_df = cat_df.drop_duplicates(subset=["Proyecto", "BaseName"], keep="first")
-                        
-                        ed = st.data_editor(
-                            cat_df[["Ver", "Revisado", "Estado", "Proyecto", "Fecha", "Subcategoría", "Documento", "Versión", "DriveLink", "Responsable", "Notas", "ID", "Ruta", "Descripción", "Ext", "Categoría", "FechaCreacion"]],
-                            column_config={
-                                "ID": None, "Ruta": None, "Ext": None, "Descripción": None, "Categoría": None,
-                                "Subcategoría": st.column_config.TextColumn("Tipo", width="small"), 
-                                "Versión": None, 
-                                "Ver": st.column_config.CheckboxColumn("👁️", width="small", default=False),
-                                "Revisado": st.column_config.CheckboxColumn("Ok", width="small", default=False),
-                                "Estado": st.column_config.SelectboxColumn("Estado", options=["Pendiente", "En Revisión", "Aprobado", "Rechazado", "Obsoleto"], required=True, width="medium"),
-                                "Proyecto": st.column_config.TextColumn(width="small", disabled=True),
-                                "Fecha": st.column_config.TextColumn("Fecha", width="small", disabled=True),
-                                "Documento": st.column_config.TextColumn(width="large", disabled=True),
-                                "DriveLink": st.column_config.LinkColumn("Link", display_text="☁️", width="small"),
-                                "Responsable": st.column_config.TextColumn("Resp.", width="small", disabled=True),
-                                "FechaCreacion": st.column_config.TextColumn("Creado el", width="small", disabled=True),
-                                "Notas": st.column_config.TextColumn("Notas", width="medium"),
-                            },
-                            hide_index=True, use_container_width=True, key=f"editor_{cat}"
-                        )
-                        editors_db[cat] = ed
+    # Render Table
+    if view_mode == "📊 Resumida":
+        view_df = display_frame(page_df)
+        view_df["LinkURL"] = view_df.apply(make_link, axis=1)
+        # COLS: Added Responsable
+        cols = ["Proyecto", "Documento", "LinkURL", "Responsable", "Estado", "Fecha", "Notas"]
+        for c in cols:
+            if c not in view_df.columns: view_df[c] = ""
+        view_df = view_df[cols]
+        
+        styled_df = view_df.style.map(style_status, subset=["Estado"])
+        
+        st.dataframe(
+            styled_df, 
+            column_config={
+                "LinkURL": st.column_config.LinkColumn("Link", display_text="☁️", width="small"),
+                "Responsable": st.column_config.TextColumn("Resp.", width="small"),
+                "Fecha": st.column_config.DateColumn("Fecha", format="YYYY-MM-DD", width="small")
+            },
+            use_container_width=True, 
+            hide_index=True
+        )
+    else:
+        editor_cols = ["Ver", "Revisado", "Estado", "Proyecto", "Fecha", "Subcategoría", "Documento", "Versión", "DriveLink", "Responsable", "Notas", "ID", "Ruta", "Descripción", "Ext", "Categoría", "FechaCreacion"]
+        editor_key = f"editor_{cat}_{sub}_{page}"
+        # edited_rows are row positions: they only hold for the rows they were made
+        # on. If this page now shows other documents (filter, re-sort), drop them.
+        page_ids = tuple(page_df["ID"])
+        pages_by_editor = st.session_state.setdefault("pages_by_editor", {})
+        if pages_by_editor.get(editor_key) != page_ids:
+            st.session_state.pop(editor_key, None)
+            pages_by_editor[editor_key] = page_ids
+        
+        ed = st.data_editor(
+            display_frame(page_df[editor_cols]),
+            column_config={
+                "ID": None, "Ruta": None, "Ext": None, "Descripción": None, "Categoría": None,
+                # Superestructura is already split by Subcategoría
+                "Subcategoría": None if sub else st.column_config.TextColumn("Tipo", width="small"), 
+                "Versión": None, 
+                "Ver": st.column_config.CheckboxColumn("👁️", width="small", default=False),
+                "Revisado": st.column_config.CheckboxColumn("Ok", width="small", default=False),
+                "Estado": st.column_config.SelectboxColumn("Estado", options=["Pendiente", "En Revisión", "Aprobado", "Rechazado", "Obsoleto"], required=True, width="medium"),
+                "Proyecto": st.column_config.TextColumn(width="small", disabled=True),
+                "Fecha": st.column_config.DateColumn("Fecha", format="YYYY-MM-DD", width="small", disabled=True),
+                "Documento": st.column_config.TextColumn(width="large", disabled=True),
+                "DriveLink": st.column_config.LinkColumn("Link", display_text="☁️", width="small"),
+                "Responsable": st.column_config.TextColumn("Resp.", width="small", disabled=True),
+                "FechaCreacion": st.column_config.TextColumn("Creado el", width="small", disabled=True),
+                "Notas": st.column_config.TextColumn("Notas", width="medium"),
+            },
+            hide_index=True, use_container_width=True, key=editor_key
+        )
+        editors_db[editor_key] = ed
+        
+        # Editor state is dropped when the page changes, so keep the deltas
+        # ({position: {column: value}}) per document ID until they are saved
+        pending = st.session_state.setdefault('pending_edits', {})
+        for pos, changes in st.session_state.get(editor_key, {}).get("edited_rows", {}).items():
+            edits = {k: v for k, v in changes.items() if k in ("Revisado", "Estado", "Notas")}
+            if not edits: continue
+            original_row = page_df.iloc[int(pos)]
+            pend = pending.setdefault(original_row["ID"], {
+                "orig": {k: original_row[k] for k in set(AGG_DIMENSIONS) | {"Notas", "Descripción"}},
+                "edits": {}
+            })
+            pend["edits"].update(edits)
+        
+        if pending:
+            st.caption(f"✏️ {len(pending)} documentos con cambios sin guardar.")
 
     # --- LOGIC PROCESSING ---
     if view_mode == "✏️ Detallada":
@@ -1026,36 +1187,39 @@ def show_explorer(df):
         # Save Action
         if save_clicked:
             changes_count = 0
-            current_db = st.session_state['notes_db']
+            changes = {}
+            agg_deltas = []
             
-            # Iterate over all editors
-            for key_id, edited_df in editors_db.items():
-                for index, row in edited_df.iterrows():
-                    fid = row["ID"]
-                    match = df[df["ID"] == fid]
-                    if not match.empty:
-                        original_row = match.iloc[0]
-                        if (row["Revisado"] != original_row["Revisado"] or 
-                            row["Estado"] != original_row["Estado"] or 
-                            row["Notas"] != original_row["Notas"]):
-                            
-                            entry = current_db.get(fid, {})
-                            if isinstance(entry, str): entry = {"notes": entry}
-                            
-                            entry["reviewed"] = bool(row["Revisado"])
-                            entry["status"] = row["Estado"]
-                            entry["notes"] = row["Notas"]
-                            if "description" not in entry and original_row["Descripción"]:
-                                entry["description"] = original_row["Descripción"]
-                                
-                            current_db[fid] = entry
-                            changes_count += 1
+            # Only visit documents with pending edits
+            for fid, pend in st.session_state.get('pending_edits', {}).items():
+                original_row, edits = pend["orig"], pend["edits"]
+                new_reviewed = edits.get("Revisado", original_row["Revisado"])
+                new_status = edits.get("Estado", original_row["Estado"])
+                new_notes = edits.get("Notas", original_row["Notas"])
+                
+                if (new_reviewed != original_row["Revisado"] or 
+                    new_status != original_row["Estado"] or 
+                    new_notes != original_row["Notas"]):
+                    
+                    # Only the fields that changed, with the value the user was looking at
+                    fields = {}
+                    if new_reviewed != original_row["Revisado"]: fields["reviewed"] = (bool(original_row["Revisado"]), bool(new_reviewed))
+                    if new_status != original_row["Estado"]: fields["status"] = (original_row["Estado"], new_status)
+                    if new_notes != original_row["Notas"]: fields["notes"] = (original_row["Notas"], new_notes)
+                    changes[fid] = fields
+                    changes_count += 1
+                    agg_deltas.append((
+                        aggregate_dims(original_row),
+                        aggregate_dims({**original_row, "Estado": new_status, "Revisado": new_reviewed})
+                    ))
             
+            st.session_state['pending_edits'] = {}
+            # Otherwise the next run would record the same positions again
+            for key in [k for k in st.session_state if str(k).startswith("editor_")]:
+                del st.session_state[key]
             if changes_count > 0:
-                st.session_state['notes_db'] = current_db
-                save_notes(current_db)
-                st.cache_data.clear()
-                st.toast(f"✅ Se guardaron {changes_count} cambios!")
+                saved, _ = commit_notes(changes, agg_deltas)
+                st.toast(f"✅ Se guardaron {len(saved)} cambios!")
                 time.sleep(0.5)
                 st.rerun()
             else:
@@ -1088,6 +1252,18 @@ def show_explorer(df):
                     if sel_row.get("DriveLink"): st.success("✅ En Drive")
                     else: st.caption("⚠️ No sincronizado")
 
+                    if not IS_CLOUD:
+                        rev_diff = get_revision_precomputer().store.get(sel_row["ID"])
+                    else:
+                        # No background worker in the cloud (it would download every revision): computed when asked
+                        rev_diff = st.session_state.get("revision_diffs", {}).get(sel_row["ID"])
+                        if rev_diff is None and st.button("🆕 Cambios vs revisión anterior", key=f"btn_rev_{sel_row['ID']}"):
+                            rev_diff = revision_diff_on_demand(df, sel_row["ID"])
+                    if rev_diff:
+                        with st.expander(f"🆕 Cambios vs revisión anterior ({rev_diff['prev_version']})"):
+                            for line in rev_diff["summary"]:
+                                st.write(line)
+
                     c_act_1, c_act_2 = st.columns(2)
                     with c_act_1:
                             if not IS_CLOUD:
@@ -1116,27 +1292,40 @@ def show_explorer(df):
                     
                     if st.button("Guardar Nota", key=f"save_btn_{sel_row['ID']}"):
                             if new_note_val != current_note_val:
-                                current_db = st.session_state['notes_db']
-                                entry = current_db.get(sel_row["ID"], {})
-                                if isinstance(entry, str): entry = {"notes": entry}
-                                entry["notes"] = new_note_val
-                                if "description" not in entry and sel_row["Descripción"]: entry["description"] = sel_row["Descripción"]
-                                if "status" not in entry and sel_row["Estado"]: entry["status"] = sel_row["Estado"]
-                                current_db[sel_row["ID"]] = entry
-                                st.session_state['notes_db'] = current_db
-                                save_notes(current_db)
-                                st.toast("✅ Nota guardada.")
-                                st.cache_data.clear()
+                                # Notes text is not an aggregate dimension: counts carry over as-is
+                                saved, _ = commit_notes({sel_row["ID"]: {"notes": (current_note_val, new_note_val)}}, [])
+                                if saved: st.toast("✅ Nota guardada.")
                                 st.rerun()
 
+                    # Read on demand: the history scans the journal files
+                    if st.checkbox("🕓 Historial de notas", key=f"hist_{sel_row['ID']}"):
+                        history = get_notes_store().history(sel_row["ID"])
+                        if not history:
+                            st.caption("Sin cambios registrados.")
+                        else:
+                            def describe(entry):
+                                if entry is None: return "(sin datos)"
+                                if isinstance(entry, str): entry = {"notes": entry}
+                                return f"{entry.get('status', 'Pendiente')} · {'✔' if entry.get('reviewed') else '—'} · {entry.get('notes', '')[:60]}"
+                            # Stamps are UTC: shown in local time
+                            labels = {
+                                ts: f"{datetime.strptime(ts, '%Y%m%dT%H%M%S.%f').replace(tzinfo=timezone.utc).astimezone():%Y-%m-%d %H:%M:%S} — {describe(entry)}"
+                                for ts, entry in history
+                            }
+                            chosen = st.selectbox("Versión", list(reversed(list(labels))), format_func=labels.get, key=f"hist_sel_{sel_row['ID']}")
+                            if st.button("↩️ Restaurar esta versión", key=f"hist_restore_{sel_row['ID']}"):
+                                if restore_notes(sel_row["ID"], chosen):
+                                    st.toast("✅ Nota restaurada.")
+                                    st.rerun()
+
                 with c_preview:
                     if sel_row["Ext"] == "PDF":
                         if not IS_CLOUD and os.path.exists(sel_row["Ruta"]):
-                            # We must handle large files carefully.
+                            # The browser streams the PDF from the local file server (Range requests),
+                            # so the page only carries the URL, not the file.
                             try:
-                                with open(sel_row["Ruta"], "rb") as f:
-                                    base64_pdf = base64.b64encode(f.read()).decode('utf-8')
-                                st.markdown(f'<iframe src="data:application/pdf;base64,{base64_pdf}#toolbar=0&navpanes=0&scrollbar=0" width="100%" height="500"></iframe>', unsafe_allow_html=True)
+                                pdf_url = get_pdf_server(DATA_DIR).url_for(sel_row["ID"])
+                                st.markdown(f'<iframe src="{pdf_url}#toolbar=0&navpanes=0&scrollbar=0" width="100%" height="500"></iframe>', unsafe_allow_html=True)
                             except Exception as e:
                                 st.error(f"Error cargando PDF: {e}")
                         elif IS_CLOUD and sel_row.get("DriveLink"):
@@ -1153,12 +1342,102 @@ def show_explorer(df):
                     else:
                         st.info("Sin vista previa.")
 
+def revision_diff_on_demand(df, fid):
+    """
+    'Changes vs previous revision' of one document, fetching both revisions
+    through the blob cache. Kept for the session; None if there is no previous
+    revision or it cannot be fetched.
+    """
+    import revision_diffs
+    row = df[df["ID"] == fid].iloc[0]
+    family = df[(df["Proyecto"] == row["Proyecto"]) & (df["BaseName"] == row["BaseName"])]
+    pair = next((p for p in revision_diffs.find_revision_pairs(family.to_dict("records")) if p[0]["ID"] == fid), None)
+    if pair is None:
+        st.caption("Sin revisión anterior.")
+        return None
+    cur, prev = pair
+    with st.spinner("Comparando con la revisión anterior..."), local_files([prev["Ruta"], cur["Ruta"]]) as paths:
+        if None in paths:
+            missing = [r["Versión"] for r, p in zip((prev, cur), paths) if p is None]
+            st.error(f"No se pudo obtener {', '.join(missing)}: no se comparan las revisiones.")
+            return None
+        text_prev, text_cur = (load_pdf_text(p, file_mtime(p)) for p in paths)
+    rev_diff = {"prev_version": prev["Versión"], "summary": get_version_comparator().summarize_changes(text_prev, text_cur)}
+    st.session_state.setdefault("revision_diffs", {})[fid] = rev_diff
+    return rev_diff
+
 # CALL THE FRAGMENT INSIDE TAB 2
 with tab2:
     show_explorer(df)
 
+# --- Diff Rendering Helpers ---
+DIFF_CONTEXT_LINES = 3
+DIFF_HUNKS_PER_PAGE = 20
+DIFF_MAX_CHARS = 300_000 # Hard cap for the HTML payload sent to the browser
+
+def file_mtime(path):
+    try:
+        return os.path.getmtime(path) if path else None
+    except OSError:
+        return None
+
+@st.cache_data(show_spinner=False, max_entries=128)
+def load_pdf_text(path, mtime):
+    """Cached PDF text extraction. mtime is part of the key so edited files are re-read."""
+    if not path or mtime is None: return ""
+    diagnostics.miss("pdf_text")
+    return get_version_comparator().extract_pdf_text(path)
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def load_diff_hunks(path_v1, path_v2, mtime_v1, mtime_v2, context=DIFF_CONTEXT_LINES):
+    """Changed hunks for a file pair, cached per (pair, mtimes)."""
+    diagnostics.miss("diff_hunks")
+    text_v1 = load_pdf_text(path_v1, mtime_v1)
+    text_v2 = load_pdf_text(path_v2, mtime_v2)
+    return get_version_comparator().compute_diff_hunks(text_v1, text_v2, context)
+
+def show_diff_hunks(path_v1, path_v2):
+    """
+    Renders only the changed hunks (with context) of a file pair.
+    More hunks are loaded on demand; once the payload cap is hit the window slides forward.
+    """
+    with diagnostics.cache_lookup("diff_hunks"):
+        hunks = load_diff_hunks(path_v1, path_v2, file_mtime(path_v1), file_mtime(path_v2))
+    if not hunks:
+        st.info("No se encontraron diferencias de texto.")
+        return
+
+    # Window position: (first hunk, row inside it, hunks per window)
+    state_key = f"diff_window_{path_v1}|{path_v2}"
+    start, start_row, count = st.session_state.get(state_key, (0, 0, DIFF_HUNKS_PER_PAGE))
+    diff_html, next_start = get_version_comparator().render_diff_hunks(hunks, start, count, DIFF_MAX_CHARS, start_row)
+
+    # A hunk cut by the payload cap counts as shown
+    shown_to = len(hunks) if next_start is None else next_start[0] + (1 if next_start[1] else 0)
+    st.caption(f"Mostrando cambios {start + 1}–{shown_to} de {len(hunks)} (±{DIFF_CONTEXT_LINES} líneas de contexto)")
+    st.components.v1.html(diff_html, height=400, scrolling=True)
+
+    if next_start is not None:
+        if st.button("⬇️ Cargar más cambios", key=f"more_{state_key}"):
+            next_hunk, next_row = next_start
+            if next_row or next_hunk - start < count:
+                # Payload cap reached: slide the window instead of growing it
+                st.session_state[state_key] = (next_hunk, next_row, DIFF_HUNKS_PER_PAGE)
+            else:
+                st.session_state[state_key] = (start, start_row, count + DIFF_HUNKS_PER_PAGE)
+            rerun_section()
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def load_revision_chain(paths, mtimes, labels):
+    """Chain comparison; each revision's text comes from the shared per-file cache, so it is parsed once."""
+    diagnostics.miss("revision_chain")
+    texts = [load_pdf_text(p, m) for p, m in zip(paths, mtimes)]
+    return get_version_comparator().compare_revision_chain(texts, labels)
+
 # TAB 3: VERSION COMPARATOR
-with tab3:
+@section_fragment
+@traced_section("tab_comparador")
+def show_comparator(df):
     st.header("⚖️ Comparador de Versiones")
     st.caption("Compara el contenido de dos carpetas para identificar cambios en archivos y texto de PDFs.")
     
@@ -1194,31 +1473,40 @@ with tab3:
         v2_input = st.session_state['selected_v2']
 
     if st.button("🚀 Comparar Versiones", type="primary"):
-        if os.path.isfile(v1_input) and os.path.isfile(v2_input):
-             # File-to-File Comparison
-             with st.spinner("Comparando documentos individuales..."):
-                 # Mock a dataframe result for single file comparison
-                 # We need to adapt logic or create a specific function
-                 # For now, let's treat them as "Modified" if name matches or just force comparison
+        # In the cloud the explorer's selections are Drive paths: their cached copies are compared
+        with local_files([v1_input, v2_input]) as (file_v1, file_v2):
+            if IS_CLOUD and None in (file_v1, file_v2):
+                missing = [p for p, f in ((v1_input, file_v1), (v2_input, file_v2)) if f is None]
+                st.error(f"No se pudo obtener {', '.join(missing)}: no se comparan los archivos.")
+            elif os.path.isfile(file_v1) and os.path.isfile(file_v2):
+                 # File-to-File Comparison
+                 with st.spinner("Comparando documentos individuales..."):
+                     # Mock a dataframe result for single file comparison
+                     # We need to adapt logic or create a specific function
+                     # For now, let's treat them as "Modified" if name matches or just force comparison
                  
-                 # Extract text
-                 t1 = version_comparator.extract_pdf_text(v1_input)
-                 t2 = version_comparator.extract_pdf_text(v2_input)
+                     # Extract text (cached per file)
+                     t1 = load_pdf_text(file_v1, file_mtime(file_v1))
+                     t2 = load_pdf_text(file_v2, file_mtime(file_v2))
                  
-                 st.session_state['comp_text_v1'] = t1
-                 st.session_state['comp_text_v2'] = t2
-                 st.session_state['comp_mode'] = "FILE"
-                 st.success("Comparación lista.")
+                     st.session_state['comp_text_v1'] = t1
+                     st.session_state['comp_text_v2'] = t2
+                     # Inventory paths: resolved again when the diff is shown
+                     st.session_state['comp_path_v1'] = v1_input
+                     st.session_state['comp_path_v2'] = v2_input
+                     st.session_state['comp_mode'] = "FILE"
+                     st.success("Comparación lista.")
                  
-        elif not os.path.isdir(v1_input) or not os.path.isdir(v2_input):
-            st.error("Por favor ingresa rutas válidas (Carpetas o Archivos).")
-        else:
-            with st.spinner("Analizando archivos y diferencias..."):
-                # Run Comparison
-                comp_df = version_comparator.compare_folders(v1_input, v2_input)
-                st.session_state['comp_df'] = comp_df
-                st.session_state['comp_mode'] = "FOLDER"
-                st.success("Análisis completado.")
+            elif not os.path.isdir(v1_input) or not os.path.isdir(v2_input):
+                st.error("Por favor ingresa rutas válidas (Carpetas o Archivos).")
+            else:
+                with st.spinner("Analizando archivos y diferencias..."):
+                    # Run Comparison
+                    comp_df = get_version_comparator().compare_folders(v1_input, v2_input)
+                    st.session_state['comp_df'] = comp_df
+                    st.session_state.pop('batch_df', None)
+                    st.session_state['comp_mode'] = "FOLDER"
+                    st.success("Análisis completado.")
     
     # Display Results
     if 'comp_mode' in st.session_state and st.session_state['comp_mode'] == "FILE":
@@ -1239,7 +1527,7 @@ with tab3:
         
         # Written Conclusion
         st.subheader("📝 Conclusión de Cambios Detectados")
-        summary_lines = version_comparator.summarize_changes(t1, t2)
+        summary_lines = get_version_comparator().summarize_changes(t1, t2)
         
         if summary_lines:
             for line in summary_lines:
@@ -1248,9 +1536,15 @@ with tab3:
              st.info("No se encontraron diferencias de texto.")
 
         # Diff
-        with st.expander("Ver Diferencias Completas (HTML)", expanded=False):
-            diff_html = version_comparator.generate_text_diff(t1, t2)
-            st.components.v1.html(diff_html, height=400, scrolling=True)
+        with st.expander("Ver Diferencias (HTML)", expanded=False):
+            paths = [st.session_state.get('comp_path_v1'), st.session_state.get('comp_path_v2')]
+            # Pinned while the hunks are read (the copies may have been evicted since the comparison)
+            with local_files(paths) as (file_v1, file_v2):
+                if IS_CLOUD and None in (file_v1, file_v2):
+                    missing = [p for p, f in zip(paths, (file_v1, file_v2)) if f is None]
+                    st.error(f"No se pudo obtener {', '.join(missing)}: no se muestran las diferencias.")
+                else:
+                    show_diff_hunks(file_v1, file_v2)
 
     elif 'comp_df' in st.session_state:
         res_df = st.session_state['comp_df']
@@ -1274,6 +1568,48 @@ with tab3:
             use_container_width=True
         )
         
+        # Batch Report
+        st.divider()
+        st.subheader("📑 Reporte de Cambios de la Entrega")
+        st.caption("Compara en paralelo el texto de todos los PDFs modificados.")
+        
+        if st.button("⚙️ Generar Reporte Completo", key="btn_batch_report"):
+            batch_progress = st.progress(0)
+            batch_df = get_version_comparator().batch_summarize_changes(
+                res_df,
+                progress=lambda done, total: batch_progress.progress(done / total)
+            )
+            st.session_state['batch_df'] = batch_df
+            st.success(f"Reporte generado: {len(batch_df)} PDFs comparados ({batch_df.attrs['recomputed']} analizados de nuevo).")
+        
+        if 'batch_df' in st.session_state:
+            batch_df = st.session_state['batch_df']
+            st.dataframe(
+                batch_df,
+                column_config={"PathV1": None, "PathV2": None},
+                use_container_width=True,
+                hide_index=True
+            )
+            
+            c_exp_1, c_exp_2 = st.columns(2)
+            with c_exp_1:
+                st.download_button(
+                    "⬇️ Exportar CSV",
+                    batch_df.to_csv(index=False).encode("utf-8-sig"),
+                    file_name="reporte_cambios.csv",
+                    mime="text/csv"
+                )
+            with c_exp_2:
+                try:
+                    st.download_button(
+                        "⬇️ Exportar Parquet",
+                        batch_df.to_parquet(index=False),
+                        file_name="reporte_cambios.parquet",
+                        mime="application/octet-stream"
+                    )
+                except ImportError:
+                    st.caption("Instala `pyarrow` para exportar a Parquet.")
+        
         # Detail View
         st.divider()
         st.subheader("🔍 Inspector de Diferencias (PDF)")
@@ -1297,12 +1633,12 @@ with tab3:
                 text_v1 = ""
                 text_v2 = ""
                 
-                # Extract Text
+                # Extract Text (cached per file)
                 if row["PathV1"] and os.path.exists(row["PathV1"]):
-                    text_v1 = version_comparator.extract_pdf_text(row["PathV1"])
+                    text_v1 = load_pdf_text(row["PathV1"], file_mtime(row["PathV1"]))
                 
                 if row["PathV2"] and os.path.exists(row["PathV2"]):
-                    text_v2 = version_comparator.extract_pdf_text(row["PathV2"])
+                    text_v2 = load_pdf_text(row["PathV2"], file_mtime(row["PathV2"]))
                 
                 with c_diff_1:
                     st.text("Texto V1 (Extracto)")
@@ -1314,7 +1650,7 @@ with tab3:
                 
                 # Written Conclusion
                 st.subheader("📝 Conclusión de Cambios Detectados")
-                summary_lines = version_comparator.summarize_changes(text_v1, text_v2)
+                summary_lines = get_version_comparator().summarize_changes(text_v1, text_v2)
                 
                 if summary_lines:
                     for line in summary_lines:
@@ -1323,10 +1659,93 @@ with tab3:
                      st.info("No se encontraron diferencias de texto.")
 
                 # Diff
-                with st.expander("Ver Diferencias Completas (HTML)", expanded=False):
-                    diff_html = version_comparator.generate_text_diff(text_v1, text_v2)
-                    st.components.v1.html(diff_html, height=400, scrolling=True)
+                with st.expander("Ver Diferencias (HTML)", expanded=False):
+                    show_diff_hunks(row["PathV1"], row["PathV2"])
+
+    # Revision Chain Mode
+    st.divider()
+    st.subheader("🔗 Cadena de Revisiones")
+    st.caption("Compara todas las revisiones consecutivas de un mismo documento (V1→V2→…→Vn).")
+    
+    if not df.empty:
+        pdf_df = df[df["Ext"] == "PDF"]
+        family_sizes = pdf_df.groupby(["Proyecto", "BaseName"], observed=True).size()
+        families = family_sizes[family_sizes > 1].reset_index()[["Proyecto", "BaseName"]]
+        
+        if families.empty:
+            st.info("No hay documentos con más de una revisión.")
+        else:
+            c_chain_1, c_chain_2 = st.columns([1, 2])
+            chain_proj = c_chain_1.selectbox("Proyecto", sorted(families["Proyecto"].unique()), key="chain_proj")
+            chain_base = c_chain_2.selectbox(
+                "Documento",
+                sorted(families[families["Proyecto"] == chain_proj]["BaseName"].unique()),
+                key="chain_base"
+            )
+            
+            chain_df = pdf_df[(pdf_df["Proyecto"] == chain_proj) & (pdf_df["BaseName"] == chain_base)]
+            chain_df = chain_df.sort_values(by=["VersionNum", "ModTime"]).drop_duplicates(subset=["VersionNum"], keep="last")
+            st.caption(" → ".join(chain_df["Versión"]))
+            
+            if st.button("🔗 Comparar Cadena", key="btn_chain"):
+                # In the cloud, revisions are downloaded once into the blob cache
+                with st.spinner("Comparando revisiones..."), local_files(chain_df["Ruta"]) as paths:
+                    paths = tuple(paths)
+                    if None in paths:
+                        # A missing revision would look like an empty text (every line removed, then re-added)
+                        missing = [v for v, p in zip(chain_df["Versión"], paths) if p is None]
+                        st.session_state.pop('chain_result', None)
+                        st.error(f"No se pudo obtener {', '.join(missing)}: no se compara la cadena.")
+                    else:
+                        st.session_state['chain_result'] = ((chain_proj, chain_base), load_revision_chain(
+                            paths, tuple(file_mtime(p) for p in paths), tuple(chain_df["Versión"])
+                        ))
+            
+            chain_result = st.session_state.get('chain_result')
+            if chain_result and chain_result[0] == (chain_proj, chain_base):
+                history_df, pairs_df = chain_result[1]
+                st.dataframe(pairs_df, use_container_width=True, hide_index=True)
+                
+                only_changes = st.checkbox("Solo líneas que cambiaron en la cadena", value=True, key="chain_only_changes")
+                view_hist = history_df
+                if only_changes and not history_df.empty:
+                    # The chain's first revision, even if it has no text (then no row carries its label)
+                    first_label = chain_df["Versión"].iloc[0]
+                    view_hist = history_df[(history_df["Introducida"] != first_label) | history_df["Eliminada"].notna()]
+                st.dataframe(
+                    view_hist,
+                    column_config={
+                        "Línea": st.column_config.TextColumn("Línea", width="large"),
+                        "Introducida": st.column_config.TextColumn("Introducida en", width="small"),
+                        "Eliminada": st.column_config.TextColumn("Eliminada en", width="small"),
+                    },
+                    use_container_width=True,
+                    hide_index=True
+                )
+
+with tab3:
+    show_comparator(df)
 
 # Footer
 st.markdown("---")
 st.caption(f"Sistema de Control Documental v3.1 (Fragments) | {datetime.now().strftime('%Y-%m-%d %H:%M')}")
+
+# --- Diagnostics ---
+def show_diagnostics():
+    history = st.session_state.get("diagnostics_history", [])
+    if not history: return
+    last = next((r for r in reversed(history) if r["kind"] == "rerun"), history[-1])
+    with st.sidebar.expander("🩺 Diagnóstico", expanded=True):
+        st.metric("Última ejecución completa", f"{last['total'] * 1000:.0f} ms")
+        spans = pd.DataFrame(sorted(last["spans"].items(), key=lambda kv: -kv[1]), columns=["Etapa", "Segundos"])
+        st.dataframe(spans, hide_index=True, use_container_width=True)
+        if last["cache"]:
+            cache = pd.DataFrame.from_dict(last["cache"], orient="index")
+            st.dataframe(cache, use_container_width=True)
+        st.caption(" · ".join(f"{k}: {v:,}" for k, v in last["rows"].items()))
+        st.line_chart(pd.DataFrame({"Total (s)": [r["total"] for r in history]}))
+        st.caption(f"Historial completo en {diagnostics.DIAGNOSTICS_LOG}")
+
+remember_diagnostics(diagnostics.finish())
+if diagnostics_enabled():
+    show_diagnostics()
@@ -0,0 +1,119 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+DIAGNOSTICS_LOG = "diagnostics.jsonl"
+LOG_MAX_BYTES = 5 * 1024 * 1024 # Rotated to .1 once it grows past this
+
+# One active trace per thread (Streamlit runs each session's script in its own thread)
+_local = threading.local()
+
+class Trace:
+    """
+    Timings of one script run (kind="rerun") or one fragment rerun
+    (kind="fragment"): named spans, cache hits/misses and row counts.
+    Spans may nest, so their sum can exceed the total.
+    """
+    def __init__(self, kind="rerun", session=None):
+        self.kind = kind
+        self.session = session
+        self.timestamp = datetime.now().isoformat(timespec="seconds")
+        self.t0 = time.perf_counter()
+        self.spans = {}
+        self.cache = {}
+        self.rows = {}
+
+    @contextmanager
+    def span(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans[name] = self.spans.get(name, 0.0) + time.perf_counter() - t0
+
+    def _cache_stats(self, name):
+        return self.cache.setdefault(name, {"hits": 0, "misses": 0})
+
+    def miss(self, name):
+        """Called from the body of a cached function (it only runs on a miss)."""
+        self._cache_stats(name)["misses"] += 1
+
+    @contextmanager
+    def cache_lookup(self, name):
+        """Times a call to a cached function; counts a hit unless its body reported a miss."""
+        before = self._cache_stats(name)["misses"]
+        with self.span(name):
+            yield
+        if self._cache_stats(name)["misses"] == before:
+            self._cache_stats(name)["hits"] += 1
+
+    def set_rows(self, name, count):
+        self.rows[name] = int(count)
+
+    def record(self):
+        return {
+            "timestamp": self.timestamp,
+            "kind": self.kind,
+            "session": self.session,
+            "total": round(time.perf_counter() - self.t0, 6),
+            "spans": {k: round(v, 6) for k, v in self.spans.items()},
+            "cache": self.cache,
+            "rows": self.rows
+        }
+
+def start(kind="rerun", session=None):
+    _local.trace = Trace(kind, session)
+    return _local.trace
+
+def current():
+    """Active trace of this thread, or None (e.g. a fragment rerun after the full run finished)."""
+    return getattr(_local, "trace", None)
+
+def finish(log_path=DIAGNOSTICS_LOG):
+    """Closes the active trace, appends it to the JSON-lines log and returns its record."""
+    trace = current()
+    if trace is None: return None
+    _local.trace = None
+    record = trace.record()
+    if log_path:
+        try:
+            append_log(log_path, record)
+        except OSError as e:
+            print(f"Error escribiendo {log_path}: {e}")
+    return record
+
+def append_log(log_path, record):
+    if os.path.exists(log_path) and os.path.getsize(log_path) > LOG_MAX_BYTES:
+        os.replace(log_path, log_path + ".1")
+    with open(log_path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+# --- No-op safe helpers (do nothing when there is no active trace) ---
+@contextmanager
+def span(name):
+    trace = current()
+    if trace is None:
+        yield
+        return
+    with trace.span(name):
+        yield
+
+@contextmanager
+def cache_lookup(name):
+    trace = current()
+    if trace is None:
+        yield
+        return
+    with trace.cache_lookup(name):
+        yield
+
+def miss(name):
+    trace = current()
+    if trace is not None: trace.miss(name)
+
+def set_rows(name, count):
+    trace = current()
+    if trace is not None: trace.set_rows(name, count)
@@ -31,10 +31,14 @@ def get_drive_service():
 
 import json
 
+# Stored per file in drive_map.json
+FILE_FIELDS = ["id", "webViewLink", "modifiedTime", "createdTime", "size", "md5Checksum"]
+
 def build_drive_map(folder_id, current_path=""):
     """
     Recursively scans a Google Drive folder and builds a map of:
-    Relative Path -> WebViewLink
+    Relative Path -> {id, webViewLink, modifiedTime, createdTime, size, md5Checksum}
+    (size and md5Checksum are missing for Google Docs/Sheets files)
     
     Returns a dictionary.
     """
@@ -52,7 +56,7 @@ def build_drive_map(folder_id, current_path=""):
             results = service.files().list(
                 q=query,
                 pageSize=1000, # Max allowed per page
-                fields="nextPageToken, files(id, name, mimeType, webViewLink)",
+                fields=f"nextPageToken, files(name, mimeType, {', '.join(FILE_FIELDS)})",
                 pageToken=page_token
             ).execute()
             
@@ -74,9 +78,11 @@ def build_drive_map(folder_id, current_path=""):
                     sub_map = build_drive_map(item['id'], rel_key)
                     drive_map.update(sub_map)
                 else:
-                    # It's a file
-                    link = item.get("webViewLink", "")
-                    drive_map[rel_key] = link
+                    # It's a file: metadata from the same list call (no extra requests)
+                    entry = {k: item[k] for k in FILE_FIELDS if k in item}
+                    entry.setdefault("webViewLink", "")
+                    if "size" in entry: entry["size"] = int(entry["size"])
+                    drive_map[rel_key] = entry
             
             page_token = results.get('nextPageToken')
             if not page_token:
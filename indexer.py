@@ -0,0 +1,334 @@
+"""
+Headless indexer: keeps the inventory up to date outside Streamlit and
+publishes it as versioned snapshots, so the dashboard only has to load the
+latest one instead of scanning on a user's request.
+
+    python indexer.py --data-dir "C:\\...\\Estructuras Control Documental"               # one pass
+    python indexer.py --data-dir "C:\\...\\Estructuras Control Documental" --interval 60 # daemon
+
+Each pass scans the repository, reads drive_map.json, fills in missing PDF
+descriptions (through the notes store, so user edits always win) and, if
+the files or the Drive map changed, publishes a new snapshot version and
+points index/LATEST at it.
+
+Snapshot layout (columnar, one partition per Proyecto):
+    index/manifest_<N>.json         version, stamp, ordered partition list
+    index/parts/<proj>_<stamp>.arrow  Arrow IPC file, memory-mapped on load
+Partition files are named by their content stamp and never modified, so a
+pass only writes the projects that changed; the rest are shared with the
+previous version. Without pyarrow, partitions are pickled DataFrames (.pkl).
+"""
+import os
+import json
+import time
+import pickle
+import hashlib
+import argparse
+from datetime import datetime
+
+import pandas as pd
+import inventory
+import notes_store
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+INDEX_DIR = "index"
+LATEST_FILE = "LATEST"
+SNAPSHOT_KEEP = 3 # Older versions linger briefly: a dashboard may still be reading one
+NOTES_FILE = "notes.json"
+DRIVE_MAP_FILE = "drive_map.json"
+DESCRIBED_FILE = "described.json" # {ID: mtime} of PDFs already analysed, so failures are not retried every pass
+DESCRIBE_BATCH = 100
+
+# --- Snapshot Files ---
+PARTS_DIR = "parts"
+
+def manifest_path(index_dir, version):
+    return os.path.join(index_dir, f"manifest_{version:06d}.json")
+
+def latest_version(index_dir=INDEX_DIR):
+    """Version LATEST points at, or None if nothing was published yet."""
+    try:
+        with open(os.path.join(index_dir, LATEST_FILE), "r", encoding="utf-8") as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+def load_manifest(index_dir, version):
+    with open(manifest_path(index_dir, version), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    manifest["stamp"] = tuple(manifest["stamp"]) # Hashable cache key, as published
+    return manifest
+
+def _arrow_schema():
+    # Fixed schema: every partition concatenates cleanly, even one where a
+    # column is entirely null (e.g. a project with no Drive links yet)
+    columns = [(c, pa.string()) for c in inventory.RAW_COLUMNS + inventory.INDEX_COLUMNS]
+    types = dict(columns, Fecha=pa.timestamp("us"), FechaCreacion=pa.timestamp("us"),
+                 ModTime=pa.timestamp("us"), VersionNum=pa.int64())
+    return pa.schema([(c, types[c]) for c in inventory.RAW_COLUMNS + inventory.INDEX_COLUMNS])
+
+def _read_partition(path):
+    if path.endswith(".arrow"):
+        # Zero-copy: string columns stay in the mapped Arrow buffers
+        table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+        return table
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+def load_snapshot(index_dir, version):
+    """
+    {"version", "created", "stamp", "rows"}; rows is a DataFrame with the
+    columns of inventory.index_files, in scan order.
+    """
+    manifest = load_manifest(index_dir, version)
+    parts = [_read_partition(os.path.join(index_dir, PARTS_DIR, p["file"])) for p in manifest["partitions"]]
+    arrow_parts = [t for t in parts if not isinstance(t, pd.DataFrame)]
+    if arrow_parts and len(arrow_parts) == len(parts):
+        table = pa.concat_tables(arrow_parts)
+        rows = table.to_pandas(types_mapper={pa.string(): pd.StringDtype("pyarrow")}.get)
+    else:
+        # Pickle fallback (or a mix, after pyarrow was installed/removed between passes)
+        frames = [t if isinstance(t, pd.DataFrame) else t.to_pandas() for t in parts]
+        rows = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    for column in ("DriveLink",):
+        # Nullable column: missing links stay None (falsy), not pd.NA
+        if column in rows.columns and rows[column].isna().any():
+            rows[column] = rows[column].astype(object).where(rows[column].notna(), None)
+    return {"version": manifest["version"], "created": manifest["created"], "stamp": manifest["stamp"], "rows": rows}
+
+def _atomic_write(path, payload):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def _write_partition(path, frame):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        if pa is not None:
+            schema = _arrow_schema()
+            table = pa.Table.from_pandas(frame[schema.names], schema=schema, preserve_index=False)
+            with pa.ipc.new_file(f, schema) as writer:
+                writer.write_table(table)
+        else:
+            pickle.dump(frame, f, protocol=pickle.HIGHEST_PROTOCOL)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def partition_stamp(rows):
+    # Same XOR-of-entry-hashes scheme as the notes and inventory stamps
+    stamp = 0
+    for r in rows:
+        stamp ^= notes_store.entry_hash(r["ID"], r)
+    return stamp
+
+def publish_snapshot(index_dir, rows, stamp):
+    """
+    Publishes rows (from inventory.index_files) as the next version.
+    Partition files are content-addressed: only projects whose rows
+    changed get a new file. Partitions and the manifest are written first
+    and LATEST is switched last (atomic replaces), so readers see either
+    the old or the new snapshot, never a mix. Returns (manifest, written).
+    """
+    parts_dir = os.path.join(index_dir, PARTS_DIR)
+    os.makedirs(parts_dir, exist_ok=True)
+    version = (latest_version(index_dir) or 0) + 1
+    ext = ".arrow" if pa is not None else ".pkl"
+
+    # Partitions in first-appearance order keep the scan order on reload
+    by_project = {}
+    for r in rows:
+        by_project.setdefault(r["Proyecto"], []).append(r)
+
+    partitions = []
+    written = 0
+    for project, members in by_project.items():
+        part_stamp = f"{partition_stamp(members):016x}"
+        project_key = hashlib.blake2b(project.encode("utf-8"), digest_size=6).hexdigest()
+        file_name = f"{project_key}_{part_stamp}{ext}"
+        if not os.path.exists(os.path.join(parts_dir, file_name)):
+            _write_partition(os.path.join(parts_dir, file_name), pd.DataFrame(members))
+            written += 1
+        partitions.append({"project": project, "stamp": part_stamp, "file": file_name, "rows": len(members)})
+
+    manifest = {
+        "version": version,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "stamp": list(stamp),
+        "format": ext[1:],
+        "partitions": partitions
+    }
+    _atomic_write(manifest_path(index_dir, version), json.dumps(manifest, ensure_ascii=False, indent=1).encode("utf-8"))
+    _atomic_write(os.path.join(index_dir, LATEST_FILE), str(version).encode("ascii"))
+    _prune_snapshots(index_dir, version)
+    manifest["stamp"] = tuple(stamp)
+    return manifest, written
+
+def _prune_snapshots(index_dir, version):
+    """Drops manifests older than SNAPSHOT_KEEP versions and partitions none of the kept ones use."""
+    kept_files = set()
+    for name in os.listdir(index_dir):
+        if not (name.startswith("manifest_") and name.endswith(".json")): continue
+        try:
+            old = int(name[len("manifest_"):-len(".json")])
+        except ValueError:
+            continue
+        if old <= version - SNAPSHOT_KEEP:
+            try: os.remove(os.path.join(index_dir, name))
+            except OSError: pass
+        else:
+            try:
+                kept_files.update(p["file"] for p in load_manifest(index_dir, old)["partitions"])
+            except (OSError, ValueError, KeyError):
+                continue
+    parts_dir = os.path.join(index_dir, PARTS_DIR)
+    for name in os.listdir(parts_dir):
+        if name not in kept_files and not name.endswith(".tmp"):
+            # Still memory-mapped by a reader on Windows: retried on the next prune
+            try: os.remove(os.path.join(parts_dir, name))
+            except OSError: pass
+
+def drive_map_fingerprint(drive_map):
+    # Same XOR-of-entry-hashes scheme as the notes and inventory stamps
+    stamp = 0
+    # Entries carry modifiedTime/md5Checksum: only real changes move the stamp
+    for key, entry in drive_map.items():
+        stamp ^= notes_store.entry_hash(key, entry)
+    return stamp
+
+def _load_json(path):
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError): return {}
+    return {}
+
+# --- Indexer ---
+class Indexer:
+    def __init__(self, data_dir, index_dir=INDEX_DIR, drive_map_path=DRIVE_MAP_FILE,
+                 notes_path=NOTES_FILE, describe=True, pull=False):
+        self.data_dir = data_dir
+        self.index_dir = index_dir
+        self.drive_map_path = drive_map_path
+        self.describe = describe
+        self.notes = notes_store.NotesStore(notes_path) if describe or pull else None
+        self.supabase = None
+        if pull:
+            import supabase_sync
+            self.supabase = supabase_sync.SupabaseSync()
+            self.pull_state_path = os.path.join(os.path.dirname(notes_path), supabase_sync.PULL_STATE_FILE)
+        self.described_path = os.path.join(index_dir, DESCRIBED_FILE)
+        self.described = _load_json(self.described_path)
+        version = latest_version(index_dir)
+        try:
+            self.manifest = load_manifest(index_dir, version) if version else None
+        except (OSError, ValueError, KeyError):
+            self.manifest = None
+        self.last_stamp = self.manifest["stamp"] if self.manifest else None
+
+    def run_once(self):
+        """One pass. Returns the published version, or None if nothing changed."""
+        t0 = time.perf_counter()
+        raw_files = inventory.scan_directory(self.data_dir)
+        drive_map = _load_json(self.drive_map_path)
+        if self.supabase:
+            # Before describing, so descriptions written at another site are not regenerated
+            self.pull_notes()
+        if self.describe:
+            self.describe_pdfs(raw_files)
+
+        stamp = (inventory.inventory_fingerprint(raw_files), drive_map_fingerprint(drive_map))
+        if stamp == self.last_stamp:
+            log(f"Sin cambios ({len(raw_files)} archivos, {time.perf_counter() - t0:.1f}s)")
+            return None
+
+        rows = inventory.index_files(raw_files, drive_map)
+        self.manifest, written = publish_snapshot(self.index_dir, rows, stamp)
+        self.last_stamp = stamp
+        log(f"Publicado snapshot {self.manifest['version']}: {len(rows)} archivos, "
+            f"{written}/{len(self.manifest['partitions'])} proyectos reescritos en {time.perf_counter() - t0:.1f}s")
+        return self.manifest["version"]
+
+    def describe_pdfs(self, raw_files):
+        """
+        Auto-descriptions for PDFs that have none. Written as optimistic
+        changes (seen value ""), so a description typed meanwhile is kept.
+        """
+        notes = self.notes.refresh().data
+        changes = {}
+        written = 0
+        for f in raw_files:
+            if f["Ext"] != "PDF": continue
+            entry = notes.get(f["ID"], {})
+            if isinstance(entry, str): entry = {"notes": entry}
+            if entry.get("description"): continue
+            mtime = f["ModTime"].timestamp()
+            if self.described.get(f["ID"]) == mtime: continue # Already tried on this revision
+
+            desc = inventory.generate_auto_description(f["Ruta"])
+            self.described[f["ID"]] = mtime
+            if desc:
+                changes[f["ID"]] = {"description": ("", desc)}
+            if len(changes) >= DESCRIBE_BATCH:
+                written += self._commit_descriptions(changes)
+                changes = {}
+        if changes:
+            written += self._commit_descriptions(changes)
+        if written:
+            log(f"Descripciones generadas: {written}")
+        os.makedirs(self.index_dir, exist_ok=True)
+        _atomic_write(self.described_path, json.dumps(self.described, ensure_ascii=False).encode("utf-8"))
+
+    def pull_notes(self):
+        """Merges the notes changed in Supabase since the last pull (errors only logged)."""
+        try:
+            applied, kept = self.supabase.pull(self.notes, self.pull_state_path)
+        except Exception as e:
+            log(f"Error trayendo notas de Supabase: {e}")
+            return
+        if applied or kept:
+            log(f"Notas de Supabase: {len(applied)} aplicadas, {len(kept)} con cambio local más reciente")
+
+    def _commit_descriptions(self, changes):
+        _, _, conflicts = self.notes.apply_changes(changes)
+        return len(changes) - len(conflicts)
+
+def log(message):
+    print(f"[{datetime.now():%Y-%m-%d %H:%M:%S}] {message}", flush=True)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Indexador del repositorio documental (publica snapshots para el tablero).")
+    parser.add_argument("--data-dir", required=True, help="Carpeta raíz del repositorio")
+    parser.add_argument("--index-dir", default=INDEX_DIR)
+    parser.add_argument("--drive-map", default=DRIVE_MAP_FILE)
+    parser.add_argument("--notes", default=NOTES_FILE)
+    parser.add_argument("--interval", type=float, default=0, help="Segundos entre pasadas (0 = una sola pasada)")
+    parser.add_argument("--no-describe", action="store_true", help="No generar descripciones automáticas de PDFs")
+    parser.add_argument("--pull", action="store_true", help="Traer en cada pasada las notas cambiadas en Supabase")
+    args = parser.parse_args(argv)
+
+    indexer = Indexer(args.data_dir, args.index_dir, args.drive_map, args.notes,
+                      describe=not args.no_describe, pull=args.pull)
+    while True:
+        try:
+            indexer.run_once()
+        except Exception as e:
+            # A daemon keeps going; the next pass retries
+            log(f"Error en la pasada: {e}")
+            if not args.interval: raise
+        if not args.interval: break
+        try:
+            time.sleep(args.interval)
+        except KeyboardInterrupt:
+            break
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,368 @@
+import os
+import re
+import pandas as pd
+from datetime import datetime
+from notes_store import entry_hash
+
+# Inventory building blocks shared by the dashboard, the benchmarks and any
+# other entry point. Nothing here depends on Streamlit.
+
+def extract_version(filename):
+    # Match patterns like v1, V2, rev3, R01, etc.
+    patterns = [
+        r"[-_ ]v(\d+)",       # _v1, -v2
+        r"[-_ ]ver(\d+)",     # _ver1
+        r"[-_ ]rev(\d+)",     # _rev0
+        r"[-_ ]R(\d+)",       # _R1
+    ]
+    for p in patterns:
+        match = re.search(p, filename, re.IGNORECASE)
+        if match:
+            return f"V{match.group(1)}"
+    return "V1" # Default
+
+def version_number(ver_str):
+    # Numeric Version for Sorting ("V3" -> 3)
+    try:
+        return int(ver_str[1:])
+    except:
+        return 1
+
+def extract_base_name(filename):
+    name, ext = os.path.splitext(filename)
+    # Remove version suffix patterns like _v1, -V2, _R1, etc.
+    patterns = [
+        r"[-_ ]v\d+$", 
+        r"[-_ ]ver\d+$", 
+        r"[-_ ]rev\d+$", 
+        r"[-_ ]R\d+$",
+        r"v\d+$"
+    ]
+    clean = name
+    for p in patterns:
+        clean = re.sub(p, "", clean, flags=re.IGNORECASE)
+    return clean.strip()
+
+def extract_subcategory(filename, category):
+    # Rule: Memorias -> Memoria
+    if category == "Memorias":
+        return "MEMORIA"
+    
+    name = filename.upper()
+    
+    # Rule: NU 200 -> PREFABRICADOS
+    if "NU-200" in name or "NU 200" in name:
+        return "PREFABRICADOS"
+
+    # Keywords for automatic subcategorization
+    keywords = [
+        "CABALLETE", "ZAPATA", "PILOTE", "TERRACERIA", "EXCAVACION", 
+        "COLUMNA", "VIGA", "LOSA", "ACERO", "MONTAJE", "TRABE", 
+        "PARAPETO", "PROCESO", "GEOMETRICO", "TOPOGRAFIA", "ODT",
+        "ALERO", "ESTRIBO", "DIAFRAGMA", "PRELOSA", "GUARNICION",
+        "BANCO", "TOPE", "NEOPRENO", "MURETE", "PREFABRICADOS", "CABEZAL"
+    ]
+    
+    for k in keywords:
+        if k in name:
+            return k
+            
+    return "GENERAL"
+
+def categorize_document(filename, path_context, description=""):
+    text = (filename + " " + path_context + " " + description).upper()
+    
+    # Priority Categories
+    if any(k in text for k in ["MEMORIA", "CALCULO", "MC", "DESIGN"]): return "Memorias"
+    if any(k in text for k in ["PROCESO", "CONSTRUCTIVO", "PROCEDIMIENTO", "MANUAL", "METODOLOGIA"]): return "Proceso Constructivo"
+    if any(k in text for k in ["GEOMETRICO", "TRAZO", "TOPOGRAFIA", "ALINEAMIENTO", "PERFIL"]): return "Geométrico"
+    if any(k in text for k in ["ODT", "ORDEN DE TRABAJO"]): return "ODT"
+
+    # Standard Categories
+    if any(k in text for k in ["CIMENTACION", "ZAPATA", "PILOTE", "TERRACERIA", "EXCAVACION"]): return "Subestructura"
+    if any(k in text for k in ["COLUMNA", "VIGA", "LOSA", "ACERO", "ESTRUCTURA", "MONTAJE", "TRABE", "CABALLETE", "NU 200", "NU-200", "CABEZAL"]): return "Superestructura"
+    if any(k in text for k in ["ARQUITECTURA", "ACABADO", "MURO", "FACHADA"]): return "Arquitectura"
+    
+    return "General"
+
+def drive_link_index(drive_map):
+    """
+    {file name: map entry}, first key in map order winning (same choice as a
+    linear scan). Built once per map so each lookup is O(1) instead of O(map).
+    """
+    index = {}
+    for path_key, value in drive_map.items():
+        index.setdefault(path_key.rsplit("/", 1)[-1], value)
+    return index
+
+def find_drive_link(file_name, project, drive_map, index=None):
+    """
+    Intenta encontrar el link de Drive buscando por nombre de archivo.
+    A veces la estructura local no es idéntica a Drive, así que buscamos
+    el nombre del archivo en la última parte de las claves del mapa.
+    Pass index (drive_link_index) when looking up many files.
+    """
+    # 1. Búsqueda exacta por nombre de archivo
+    if index is None: index = drive_link_index(drive_map)
+    value = index.get(file_name)
+    return drive_entry(value).get("webViewLink", "") if value is not None else None
+
+# --- Drive Map Entries ---
+# drive_service.py stores {"id", "webViewLink", "modifiedTime", "createdTime",
+# "size", "md5Checksum"} per path; maps written before that hold only the link.
+def drive_entry(value):
+    return value if isinstance(value, dict) else {"webViewLink": value}
+
+def parse_drive_time(value):
+    """RFC 3339 time from the Drive API ("2026-02-20T15:04:05.123Z") as a naive local datetime, or None."""
+    if not value: return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).astimezone().replace(tzinfo=None)
+    except ValueError:
+        return None
+
+def parse_date_folder(name):
+    """"20260220" -> datetime(2026, 2, 20); None if the folder is not a valid YYYYMMDD date."""
+    if not (name.isdigit() and len(name) == 8): return None
+    try:
+        return datetime.strptime(name, "%Y%m%d")
+    except ValueError:
+        # Invalid date format in folder name, ignore
+        return None
+
+def today():
+    return datetime.combine(datetime.now().date(), datetime.min.time())
+
+def scan_drive_map(drive_map):
+    """
+    Cloud mode inventory: builds the raw list of file dictionaries from the
+    drive_map.json keys instead of the filesystem.
+    """
+    raw_files = []
+    for rel_key, value in drive_map.items():
+        meta = drive_entry(value)
+        # rel_key is something like "ProjectName/20260220/Person/File.pdf"
+        parts = rel_key.split('/')
+        project = parts[0] if len(parts) > 0 else "General"
+        
+        # Simple metadata extraction from name/path
+        filename = parts[-1]
+        ext = filename.split('.')[-1].upper() if '.' in filename else ""
+        
+        # Try to find date and person (mimicking local structure)
+        date_folder = parse_date_folder(parts[1]) if len(parts) > 2 else None
+        person = "Desconocido"
+        if date_folder and len(parts) > 3: person = parts[2]
+
+        final_date = date_folder or today()
+        version = extract_version(filename)
+        # Real Drive times keep the inventory fingerprint stable between scans
+        # (a link-only map falls back to "now", i.e. every scan looks new)
+        mod_time = parse_drive_time(meta.get("modifiedTime")) or datetime.now()
+        
+        raw_files.append({
+            "ID": rel_key,
+            "Proyecto": project,
+            "Fecha": final_date,
+            "FechaCreacion": parse_drive_time(meta.get("createdTime")),
+            "Responsable": person,
+            "Documento": filename,
+            "Ext": ext,
+            "Ruta": rel_key, # In Cloud, ID and Ruta are the same rel_key
+            "ModTime": mod_time,
+            "Versión": version
+        })
+    return raw_files
+
+def scan_directory(base_dir):
+    """
+    Scans the directory and returns a raw list of file dictionaries.
+    """
+    if not os.path.exists(base_dir): return []
+    
+    raw_files = []
+    
+    for root, dirs, files in os.walk(base_dir):
+        rel_path = os.path.relpath(root, base_dir)
+        parts = rel_path.split(os.sep)
+        
+        # Structure Parsing
+        project = parts[0] if len(parts) > 0 and parts[0] != "." else "General"
+        person = "Desconocido"
+        
+        # Try to find Date (YYYYMMDD) and Person
+        date_folder = parse_date_folder(parts[1]) if len(parts) > 1 else None
+        if len(parts) > 1 and parts[1].isdigit() and len(parts[1]) == 8:
+            if len(parts) > 2: person = parts[2]
+            
+        for file in files:
+            if file.lower().endswith(('.pdf', '.dwg', '.rvt', '.xlsx', '.doc', '.docx')):
+                full_path = os.path.join(root, file)
+                fid = os.path.relpath(full_path, base_dir)
+                
+                try:
+                    stat = os.stat(full_path)
+                    # Real datetimes; formatted only when rendered
+                    ctime = datetime.fromtimestamp(stat.st_ctime)
+                    mod_time = datetime.fromtimestamp(stat.st_mtime)
+                except:
+                    ctime = mod_time = datetime.now()
+
+                final_date = date_folder or today()
+                
+                ext = file.split('.')[-1].upper()
+                version = extract_version(file)
+                
+                raw_files.append({
+                    "ID": fid,
+                    "Proyecto": project,
+                    "Fecha": final_date,
+                    "FechaCreacion": ctime,
+                    "Responsable": person,
+                    "Documento": file,
+                    "Ext": ext,
+                    "Ruta": full_path,
+                    "ModTime": mod_time,
+                    "Versión": version
+                })
+                
+    return raw_files
+
+def inventory_fingerprint(raw_files):
+    # Same XOR-of-entry-hashes scheme as the notes stamp
+    stamp = 0
+    for f in raw_files:
+        stamp ^= entry_hash(f["ID"], f)
+    return stamp
+
+def get_pdf_metadata(file_path):
+    import pypdf # Only needed when a PDF is actually opened
+    try:
+        reader = pypdf.PdfReader(file_path)
+        if reader.metadata and "/CreationDate" in reader.metadata:
+            d = reader.metadata["/CreationDate"]
+            if d.startswith("D:"): d = d[2:]
+            if len(d) >= 8: return datetime.strptime(d[:8], "%Y%m%d").strftime("%Y-%m-%d")
+    except: pass
+    return None
+
+def generate_auto_description(file_path):
+    import pypdf
+    try:
+        reader = pypdf.PdfReader(file_path)
+        if len(reader.pages) > 0:
+            text = reader.pages[0].extract_text()
+            if not text: return ""
+            lines = [l.strip() for l in text.split('\n') if len(l.strip()) > 3]
+            keywords = ["CONTENIDO", "PLANO:", "PROYECTO:", "CONTIENE:", "TITULO:"]
+            summary = []
+            for line in lines:
+                for k in keywords:
+                    if k in line.upper():
+                        val = line.upper().split(k, 1)[-1].strip()
+                        if len(val) > 2: summary.append(f"{k.title()} {val}")
+            
+            if not summary:
+                 caps = [l for l in lines if l.isupper() and not l.replace(' ','').isdigit()]
+                 summary = caps[:3]
+            return " | ".join(summary[:4])
+    except: return ""
+    return ""
+
+# Columns that depend only on the files and the Drive map (not on notes):
+# what the indexer computes ahead of time and publishes.
+INDEX_COLUMNS = ["Categoría", "Subcategoría", "DriveLink", "BaseName", "VersionNum"]
+
+def index_files(raw_files, drive_map):
+    """
+    Adds the notes-independent columns to each raw file dictionary.
+    Categories here ignore the description; merge_notes recomputes them
+    for the documents that have one.
+    """
+    rows = []
+    links = drive_link_index(drive_map)
+    for f in raw_files:
+        # Auto-Category
+        cat = categorize_document(f["Documento"], f["Ruta"])
+        
+        row = f.copy()
+        row.update({
+            "Categoría": cat,
+            "Subcategoría": extract_subcategory(f["Documento"], cat),
+            # Drive Link
+            "DriveLink": find_drive_link(f["Documento"], f["Proyecto"], drive_map, links),
+            # Base Name for Version Grouping
+            "BaseName": extract_base_name(f["Documento"]),
+            # Numeric Version for Sorting
+            "VersionNum": version_number(f["Versión"])
+        })
+        rows.append(row)
+    return rows
+
+# Column order of the merged DataFrame
+RAW_COLUMNS = ["ID", "Proyecto", "Fecha", "FechaCreacion", "Responsable", "Documento", "Ext", "Ruta", "ModTime", "Versión"]
+NOTES_COLUMNS = ["Ver", "Revisado", "Estado", "Notas", "Descripción"]
+MERGED_COLUMNS = RAW_COLUMNS + NOTES_COLUMNS + INDEX_COLUMNS
+
+def merge_notes(rows, notes_db):
+    """
+    Merges indexed rows (see index_files; a list of dicts or a DataFrame,
+    e.g. a loaded snapshot) with the notes into the main DataFrame.
+    Works column by column; only documents with a description are
+    re-categorized row by row.
+    """
+    frame = rows if isinstance(rows, pd.DataFrame) else pd.DataFrame(rows)
+    if frame.empty: return pd.DataFrame()
+    
+    # Get DB data directly (notes_db is just a dict)
+    entries = []
+    for fid in frame["ID"]:
+        db_entry = notes_db.get(fid, {})
+        if isinstance(db_entry, str): db_entry = {"notes": db_entry} # Compat
+        entries.append(db_entry)
+    
+    merged = frame.copy()
+    merged["Ver"] = False
+    # Defaults
+    merged["Revisado"] = [e.get("reviewed", False) for e in entries] # New field
+    merged["Estado"] = [e.get("status", "Pendiente") for e in entries]
+    merged["Notas"] = [e.get("notes", "") for e in entries]
+    merged["Descripción"] = desc = [e.get("description", "") for e in entries]
+    
+    # The description can move a document to another category
+    described = [k for k, d in enumerate(desc) if d]
+    if described:
+        cats = merged["Categoría"].astype(object).to_numpy(copy=True)
+        subcats = merged["Subcategoría"].astype(object).to_numpy(copy=True)
+        docs, paths = merged["Documento"].to_numpy(), merged["Ruta"].to_numpy()
+        for k in described:
+            cats[k] = categorize_document(docs[k], paths[k], desc[k])
+            subcats[k] = extract_subcategory(docs[k], cats[k])
+        merged["Categoría"] = cats
+        merged["Subcategoría"] = subcats
+    
+    return apply_schema(merged[[c for c in MERGED_COLUMNS if c in merged.columns]])
+
+# --- Typed Schema ---
+# Low-cardinality text as categoricals (groupby/filter on integer codes),
+# real datetimes and bool/int columns. Display formatting happens at render time.
+CATEGORY_COLUMNS = ["Proyecto", "Categoría", "Subcategoría", "Estado", "Ext", "Responsable", "Versión"]
+
+def apply_schema(df):
+    df = df.copy()
+    for c in CATEGORY_COLUMNS:
+        if c in df.columns: df[c] = df[c].astype("category")
+    # Also accepts the "YYYY-MM-DD" strings of older snapshots
+    for c in ("Fecha", "FechaCreacion", "ModTime"):
+        if c in df.columns: df[c] = pd.to_datetime(df[c], errors="coerce")
+    for c in ("Ver", "Revisado"):
+        if c in df.columns: df[c] = df[c].fillna(False).astype(bool)
+    if "VersionNum" in df.columns:
+        df["VersionNum"] = df["VersionNum"].astype("int32")
+    return df
+
+def build_dataframe(raw_files, notes_db, drive_map):
+    """
+    Merges inventory, notes and Drive links into the main DataFrame.
+    """
+    return merge_notes(index_files(raw_files, drive_map), notes_db)
@@ -0,0 +1,383 @@
+import os
+import json
+import hashlib
+import time
+import shutil
+import threading
+from collections import namedtuple
+from datetime import datetime, timezone
+
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+    import fcntl
+
+# version: increases by one on every commit
+# data: {ID: entry}; never mutated once published
+# stamp: content fingerprint of data (see notes_fingerprint)
+NotesSnapshot = namedtuple("NotesSnapshot", ["version", "data", "stamp"])
+
+# --- Content Fingerprints ---
+# Order-independent XOR of per-entry hashes: can be updated in O(1) when a
+# single entry changes, and is used as cache key instead of the data itself.
+def entry_hash(key, entry):
+    if not entry: return 0
+    payload = json.dumps([key, entry], sort_keys=True, ensure_ascii=False, default=str)
+    return int.from_bytes(hashlib.blake2b(payload.encode("utf-8"), digest_size=8).digest(), "big")
+
+def notes_fingerprint(notes_db):
+    stamp = 0
+    for fid, entry in notes_db.items():
+        stamp ^= entry_hash(fid, entry)
+    return stamp
+
+# Value assumed for a field that an entry does not have (same defaults as build_dataframe)
+FIELD_DEFAULTS = {"status": "Pendiente", "notes": "", "description": "", "reviewed": False}
+
+# Result of apply_changes: the conflicting field keeps the stored value
+NotesConflict = namedtuple("NotesConflict", ["fid", "field", "stored", "yours"])
+
+class FileLock:
+    """
+    Exclusive inter-process lock on a side file (msvcrt on Windows, flock elsewhere).
+    """
+    def __init__(self, path, timeout=10):
+        self.path = path
+        self.timeout = timeout
+        self.handle = None
+
+    def __enter__(self):
+        self.handle = open(self.path, "a+b")
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                if msvcrt:
+                    self.handle.seek(0)
+                    msvcrt.locking(self.handle.fileno(), msvcrt.LK_NBLCK, 1)
+                else:
+                    fcntl.flock(self.handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return self
+            except OSError:
+                if time.monotonic() > deadline:
+                    self.handle.close()
+                    raise TimeoutError(f"No se pudo bloquear {self.path}")
+                time.sleep(0.05)
+
+    def __exit__(self, *exc):
+        try:
+            if msvcrt:
+                self.handle.seek(0)
+                msvcrt.locking(self.handle.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(self.handle.fileno(), fcntl.LOCK_UN)
+        finally:
+            self.handle.close()
+
+def _file_signature(path):
+    try:
+        stat = os.stat(path)
+        return (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        return None
+
+def load_notes_file(path):
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except: return {}
+    return {}
+
+# --- Journal ---
+# One JSON line per changed document: {"ts": stamp, "id": ID, "entry": full entry after the change}.
+# Records hold the whole entry, so replaying one twice gives the same result.
+JOURNAL_COMPACT_EVERY = 1000 # Records before the journal is folded into a new snapshot
+HISTORY_KEEP = 50 # Snapshots kept in the history folder (older journals are pruned with them)
+
+def now_stamp():
+    # Sortable as text and valid in file names on every OS. UTC, so the order
+    # holds across DST changes and machines in other time zones.
+    return datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S.%f")
+
+def read_journal(path, start=0):
+    """
+    Returns (records, end_offset) from byte offset start.
+    A last line without newline (torn write) is not consumed.
+    """
+    try:
+        with open(path, "rb") as f:
+            f.seek(start)
+            chunk = f.read()
+    except OSError:
+        return [], start
+    end = chunk.rfind(b"\n") + 1
+    records = []
+    for line in chunk[:end].splitlines():
+        if not line.strip(): continue
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            continue
+    return records, start + end
+
+def replay(data, records):
+    for rec in records:
+        if rec.get("entry") is None: data.pop(rec["id"], None)
+        else: data[rec["id"]] = rec["entry"]
+    return data
+
+def _history_files(history_dir, prefix):
+    try:
+        names = sorted(n for n in os.listdir(history_dir) if n.startswith(prefix))
+    except OSError:
+        return []
+    return [(n[len(prefix):].rsplit(".", 1)[0], os.path.join(history_dir, n)) for n in names]
+
+class NotesStore:
+    """
+    Process-wide notes shared by every session (read-mostly).
+    Readers take the current snapshot and never see it change; writes build
+    a new dict with the changes applied (copy-on-write) and publish it
+    atomically, so other sessions pick it up on their next rerun.
+
+    Writes are optimistic: callers send only the fields they changed, with
+    the value they were looking at. A field is applied only if nobody else
+    changed it in the meantime; otherwise it is reported as a conflict and
+    the stored value wins. Each entry carries a "_rev" counter.
+
+    On disk: notes.json is the last snapshot and notes.journal the changes
+    made since, appended and fsynced per save (O(change)). Every
+    JOURNAL_COMPACT_EVERY records the journal is folded into a new snapshot
+    and moved to the history folder, which keeps the snapshots and journals
+    used by history() and state_at().
+    """
+    def __init__(self, path, journal_path=None, history_dir=None):
+        self.path = path
+        self.journal_path = journal_path or os.path.splitext(path)[0] + ".journal"
+        self.history_dir = history_dir or os.path.join(os.path.dirname(path), "notes_history")
+        self.lock = threading.Lock()
+        self.file_lock = FileLock(path + ".lock")
+        with self.file_lock:
+            data = self._load()
+            self._snapshot = NotesSnapshot(0, data, notes_fingerprint(data))
+            if not _history_files(self.history_dir, "snapshot_"):
+                # Base for point-in-time restores
+                self._archive_snapshot(now_stamp())
+
+    def current(self):
+        return self._snapshot
+
+    def refresh(self):
+        """
+        current(), after picking up writes from other processes (e.g. the indexer).
+        Costs two stats when nothing changed; the locks are only taken otherwise.
+        """
+        try:
+            journal_size = os.path.getsize(self.journal_path)
+        except OSError:
+            journal_size = 0
+        if _file_signature(self.path) == self._snapshot_sig and journal_size == self._journal_offset:
+            return self._snapshot
+        with self.lock, self.file_lock:
+            return self._sync()
+
+    def _load(self):
+        """Snapshot + journal replay (recovery path). Needs the file lock."""
+        data = load_notes_file(self.path)
+        records, offset = read_journal(self.journal_path)
+        replay(data, records)
+        if os.path.exists(self.journal_path) and os.path.getsize(self.journal_path) > offset:
+            # Drop a torn last record so the next append starts on a clean line
+            with open(self.journal_path, "r+b") as f:
+                f.truncate(offset)
+        self._snapshot_sig = _file_signature(self.path)
+        self._journal_offset = offset
+        self._journal_records = len(records)
+        return data
+
+    def _sync(self):
+        """Picks up what other processes wrote since our last look. Needs both locks."""
+        previous = self._snapshot
+        try:
+            journal_size = os.path.getsize(self.journal_path)
+        except OSError:
+            journal_size = 0
+        if _file_signature(self.path) != self._snapshot_sig or journal_size < self._journal_offset:
+            # Compacted elsewhere: start over from the new snapshot
+            data = self._load()
+        elif journal_size > self._journal_offset:
+            records, self._journal_offset = read_journal(self.journal_path, self._journal_offset)
+            self._journal_records += len(records)
+            data = replay(dict(previous.data), records)
+        else:
+            return previous
+        self._snapshot = NotesSnapshot(previous.version + 1, data, notes_fingerprint(data))
+        return self._snapshot
+
+    def apply_changes(self, changes):
+        """
+        changes: {ID: {field: (seen_value, new_value)}}
+        Returns (previous, new, conflicts); previous is the exact snapshot the
+        changes were applied on, conflicts a list of NotesConflict.
+        """
+        with self.lock, self.file_lock:
+            previous = self._sync()
+            data = dict(previous.data)
+            stamp = previous.stamp
+            conflicts = []
+            changed = []
+            for fid, fields in changes.items():
+                stored = data.get(fid, {})
+                entry = {"notes": stored} if isinstance(stored, str) else dict(stored)
+                applied = False
+                for field, (seen, new) in fields.items():
+                    current = entry.get(field, FIELD_DEFAULTS.get(field))
+                    if current == new: continue
+                    if current != seen:
+                        conflicts.append(NotesConflict(fid, field, current, new))
+                        continue
+                    entry[field] = new
+                    applied = True
+                if not applied: continue
+                entry["_rev"] = entry.get("_rev", 0) + 1
+                stamp ^= entry_hash(fid, data.get(fid)) ^ entry_hash(fid, entry)
+                data[fid] = entry
+                changed.append(fid)
+
+            if not changed:
+                return previous, previous, conflicts
+            return previous, self._publish(previous, data, stamp, changed), conflicts
+
+    def restore(self, fid, ts):
+        """
+        Point-in-time restore of one document: its entry as of stamp ts is
+        written back as a new change (so the restore itself is in the history).
+        Returns (previous, new) snapshots.
+        """
+        snapshots = _history_files(self.history_dir, "snapshot_")
+        if not snapshots or ts < snapshots[0][0]:
+            raise ValueError(f"{ts} es anterior al historial conservado")
+        entry = None
+        for rec_ts, rec_entry in self.history(fid):
+            if rec_ts > ts: break
+            entry = rec_entry
+        with self.lock, self.file_lock:
+            previous = self._sync()
+            current = previous.data.get(fid)
+            if entry == current:
+                return previous, previous
+            data = dict(previous.data)
+            if entry is None:
+                data.pop(fid, None)
+            else:
+                # Bump past the current revision so concurrent editors see a change
+                current_rev = current.get("_rev", 0) if isinstance(current, dict) else 0
+                entry = {"notes": entry} if isinstance(entry, str) else dict(entry)
+                entry["_rev"] = current_rev + 1
+                data[fid] = entry
+            stamp = previous.stamp ^ entry_hash(fid, current) ^ entry_hash(fid, entry)
+            return previous, self._publish(previous, data, stamp, [fid])
+
+    def _publish(self, previous, data, stamp, changed):
+        """Journals the changed entries, then makes data the current snapshot. Needs both locks."""
+        self._append([{"ts": now_stamp(), "id": fid, "entry": data.get(fid)} for fid in changed])
+        snapshot = NotesSnapshot(previous.version + 1, data, stamp)
+        self._snapshot = snapshot
+        if self._journal_records >= JOURNAL_COMPACT_EVERY:
+            self._compact(data)
+        return snapshot
+
+    def _append(self, records):
+        payload = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records).encode("utf-8")
+        with open(self.journal_path, "ab") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        self._journal_offset += len(payload)
+        self._journal_records += len(records)
+
+    def _compact(self, data):
+        """New snapshot with everything journaled so far; the journal moves to the history folder."""
+        ts = now_stamp()
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=4, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        # Atomic replace: readers never see a half-written file.
+        # A crash before the journal is moved only means replaying records already in the snapshot.
+        os.replace(tmp_path, self.path)
+        self._archive_snapshot(ts)
+        if os.path.exists(self.journal_path):
+            os.replace(self.journal_path, os.path.join(self.history_dir, f"journal_{ts}.jsonl"))
+        self._snapshot_sig = _file_signature(self.path)
+        self._journal_offset = 0
+        self._journal_records = 0
+        self._prune_history()
+
+    def _archive_snapshot(self, ts):
+        os.makedirs(self.history_dir, exist_ok=True)
+        if os.path.exists(self.path):
+            shutil.copyfile(self.path, os.path.join(self.history_dir, f"snapshot_{ts}.json"))
+        else:
+            with open(os.path.join(self.history_dir, f"snapshot_{ts}.json"), "w", encoding="utf-8") as f:
+                json.dump({}, f)
+
+    def _prune_history(self):
+        snapshots = _history_files(self.history_dir, "snapshot_")
+        if len(snapshots) <= HISTORY_KEEP: return
+        oldest_kept = snapshots[-HISTORY_KEEP][0]
+        # Journals up to the oldest kept snapshot are already contained in it
+        stale = [p for _, p in snapshots[:-HISTORY_KEEP]]
+        stale += [p for ts, p in _history_files(self.history_dir, "journal_") if ts <= oldest_kept]
+        for path in stale:
+            try: os.remove(path)
+            except OSError: pass
+
+    # --- History (reads only; rare, on demand) ---
+    def _journal_files(self):
+        return [p for _, p in _history_files(self.history_dir, "journal_")] + [self.journal_path]
+
+    def history(self, fid):
+        """
+        [(stamp, entry)] of one document, oldest first: its value in the
+        oldest kept snapshot, then every journaled change.
+        """
+        with self.lock, self.file_lock:
+            snapshots = _history_files(self.history_dir, "snapshot_")
+            result = []
+            if snapshots:
+                base_ts, base_path = snapshots[0]
+                base = load_notes_file(base_path)
+                if fid in base: result.append((base_ts, base[fid]))
+            else:
+                base_ts = ""
+            for path in self._journal_files():
+                records, _ = read_journal(path)
+                result.extend((r["ts"], r.get("entry")) for r in records if r["id"] == fid and r["ts"] > base_ts)
+            return result
+
+    def changed_since(self, ts):
+        """{ID: stamp of its last change} for documents changed after stamp ts."""
+        with self.lock, self.file_lock:
+            changed = {}
+            # An archived journal only holds records up to its compaction stamp
+            paths = [p for s, p in _history_files(self.history_dir, "journal_") if s > ts] + [self.journal_path]
+            for path in paths:
+                records, _ = read_journal(path)
+                for r in records:
+                    if r["ts"] > ts: changed[r["id"]] = max(r["ts"], changed.get(r["id"], ""))
+            return changed
+
+    def state_at(self, ts):
+        """All notes as they were at stamp ts, or None if ts is older than the kept history."""
+        with self.lock, self.file_lock:
+            base = [(s, p) for s, p in _history_files(self.history_dir, "snapshot_") if s <= ts]
+            if not base: return None
+            base_ts, base_path = base[-1]
+            data = load_notes_file(base_path)
+            for path in self._journal_files():
+                records, _ = read_journal(path)
+                replay(data, [r for r in records if base_ts < r["ts"] <= ts])
+            return data
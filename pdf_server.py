@@ -0,0 +1,134 @@
+import os
+import re
+import threading
+import mimetypes
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs, quote
+
+CHUNK_SIZE = 256 * 1024
+
+class _FileHandler(BaseHTTPRequestHandler):
+    """
+    Serves files below the server root with HTTP Range support and
+    validators (ETag / Last-Modified), so the browser's PDF viewer can
+    stream pages on demand and reuse its cache across reruns.
+    URL format: /file?id=<path relative to root>
+    """
+    root = ""
+
+    def log_message(self, format, *args):
+        pass # Keep the Streamlit console clean
+
+    def _resolve(self):
+        query = parse_qs(urlparse(self.path).query)
+        rel_id = query.get("id", [""])[0]
+        if not rel_id: return None
+        root = os.path.realpath(self.root)
+        full_path = os.path.realpath(os.path.join(root, rel_id))
+        # Never serve anything outside the repository root
+        if os.path.commonpath([root, full_path]) != root or not os.path.isfile(full_path):
+            return None
+        return full_path
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def _serve(self, send_body):
+        full_path = self._resolve()
+        if not full_path:
+            self.send_error(404, "Archivo no encontrado")
+            return
+
+        stat = os.stat(full_path)
+        size = stat.st_size
+        etag = f'"{stat.st_mtime_ns:x}-{size:x}"'
+        last_modified = formatdate(stat.st_mtime, usegmt=True)
+
+        # Conditional request: nothing changed since the browser's copy
+        if self.headers.get("If-None-Match") == etag or self._not_modified_since(stat.st_mtime):
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        start, end = 0, size - 1
+        status = 200
+        range_header = self.headers.get("Range")
+        if range_header and self.headers.get("If-Range", etag) == etag:
+            match = re.fullmatch(r"bytes=(\d*)-(\d*)", range_header.strip())
+            if not match or (not match.group(1) and not match.group(2)):
+                self._range_not_satisfiable(size)
+                return
+            if match.group(1):
+                start = int(match.group(1))
+                if match.group(2): end = min(int(match.group(2)), size - 1)
+            else:
+                # Suffix range: last N bytes
+                start = max(0, size - int(match.group(2)))
+            if start > end or start >= size:
+                self._range_not_satisfiable(size)
+                return
+            status = 206
+
+        length = end - start + 1
+        self.send_response(status)
+        self.send_header("Content-Type", mimetypes.guess_type(full_path)[0] or "application/octet-stream")
+        self.send_header("Content-Length", str(length))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", last_modified)
+        self.send_header("Cache-Control", "private, max-age=0, must-revalidate")
+        self.send_header("Content-Disposition", "inline")
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+
+        if not send_body: return
+        try:
+            with open(full_path, "rb") as f:
+                f.seek(start)
+                remaining = length
+                while remaining > 0:
+                    chunk = f.read(min(CHUNK_SIZE, remaining))
+                    if not chunk: break
+                    self.wfile.write(chunk)
+                    remaining -= len(chunk)
+        except (BrokenPipeError, ConnectionResetError):
+            pass # Viewer cancelled the request (normal while scrolling)
+
+    def _not_modified_since(self, mtime):
+        since = self.headers.get("If-Modified-Since")
+        if not since or self.headers.get("If-None-Match"): return False
+        try:
+            return int(mtime) <= parsedate_to_datetime(since).timestamp()
+        except (TypeError, ValueError):
+            return False
+
+    def _range_not_satisfiable(self, size):
+        self.send_response(416)
+        self.send_header("Content-Range", f"bytes */{size}")
+        self.end_headers()
+
+class PdfServer:
+    """
+    Local background HTTP server for document previews.
+    Binds to localhost only; port 0 picks a free port.
+    """
+    def __init__(self, root, host="127.0.0.1", port=0):
+        handler = type("FileHandler", (_FileHandler,), {"root": root})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.host, self.port = self.httpd.server_address[:2]
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="pdf-server", daemon=True)
+        self.thread.start()
+
+    def url_for(self, rel_id):
+        return f"http://{self.host}:{self.port}/file?id={quote(rel_id)}"
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
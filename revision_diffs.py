@@ -0,0 +1,143 @@
+import os
+import json
+import queue
+import threading
+
+REVISION_DIFFS_FILE = "revision_diffs.json"
+
+def find_revision_pairs(rows):
+    """
+    Groups inventory rows by (Proyecto, BaseName) and returns every
+    (row, previous_row) pair where previous_row is the closest lower VersionNum.
+    Only PDFs are considered, since the diff works on extracted text.
+    """
+    families = {}
+    for r in rows:
+        if r.get("Ext") != "PDF": continue
+        families.setdefault((r["Proyecto"], r["BaseName"]), []).append(r)
+
+    pairs = []
+    for members in families.values():
+        if len(members) < 2: continue
+        members.sort(key=lambda r: r["VersionNum"])
+        for prev, cur in zip(members, members[1:]):
+            if cur["VersionNum"] > prev["VersionNum"]:
+                pairs.append((cur, prev))
+    return pairs
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+class RevisionDiffStore:
+    """
+    Persistent {ID: summary vs previous revision} map.
+    An entry is current while both file mtimes and the predecessor ID match.
+    """
+    def __init__(self, path=REVISION_DIFFS_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.data = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.data = json.load(f)
+            except Exception:
+                self.data = {}
+
+    def get(self, fid):
+        with self.lock:
+            return self.data.get(fid)
+
+    def is_current(self, fid, prev_id, mtime, prev_mtime):
+        entry = self.get(fid)
+        return bool(entry) and entry["prev_id"] == prev_id and entry["mtime"] == mtime and entry["prev_mtime"] == prev_mtime
+
+    def put(self, fid, entry):
+        with self.lock:
+            self.data[fid] = entry
+
+    def save(self):
+        with self.lock:
+            snapshot = dict(self.data)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+class RevisionPrecomputer:
+    """
+    Background worker that diffs new revisions against their predecessor
+    as soon as the scan detects them, so the explorer can show the summary
+    without waiting for extraction.
+    """
+    def __init__(self, store):
+        self.store = store
+        self.queue = queue.Queue()
+        self.pending = set()
+        self.pending_lock = threading.Lock()
+        self.thread = threading.Thread(target=self._run, name="revision-precompute", daemon=True)
+        self.thread.start()
+
+    def submit(self, pairs):
+        """Queues the pairs whose stored summary is missing or stale. Returns how many were queued."""
+        queued = 0
+        for cur, prev in pairs:
+            job = (cur["ID"], cur["Ruta"], cur["Versión"], prev["ID"], prev["Ruta"], prev["Versión"])
+            if self.store.is_current(cur["ID"], prev["ID"], _mtime(cur["Ruta"]), _mtime(prev["Ruta"])):
+                continue
+            with self.pending_lock:
+                if cur["ID"] in self.pending: continue
+                self.pending.add(cur["ID"])
+            self.queue.put(job)
+            queued += 1
+        return queued
+
+    def _run(self):
+        import version_comparator # Imported in the worker thread, off the UI path
+        dirty = 0
+        while True:
+            try:
+                job = self.queue.get(timeout=2)
+            except queue.Empty:
+                if dirty:
+                    self._save()
+                    dirty = 0
+                continue
+
+            fid, path, version, prev_id, prev_path, prev_version = job
+            try:
+                mtime, prev_mtime = _mtime(path), _mtime(prev_path)
+                if mtime is not None and prev_mtime is not None:
+                    text_prev = version_comparator.extract_pdf_text(prev_path)
+                    text_cur = version_comparator.extract_pdf_text(path)
+                    added, removed = version_comparator.diff_line_changes(text_prev, text_cur)
+                    self.store.put(fid, {
+                        "prev_id": prev_id,
+                        "prev_version": prev_version,
+                        "version": version,
+                        "mtime": mtime,
+                        "prev_mtime": prev_mtime,
+                        "added": len(added),
+                        "removed": len(removed),
+                        "summary": version_comparator.format_change_summary(added, removed)
+                    })
+                    dirty += 1
+            except Exception as e:
+                print(f"Error precalculando diferencias de {fid}: {e}")
+            finally:
+                with self.pending_lock:
+                    self.pending.discard(fid)
+
+            # Flush regularly on long backlogs, not on every item
+            if dirty >= 25:
+                self._save()
+                dirty = 0
+
+    def _save(self):
+        try:
+            self.store.save()
+        except OSError as e:
+            print(f"Error guardando {self.store.path}: {e}")
@@ -0,0 +1,60 @@
+import unicodedata
+
+def normalize_text(text):
+    """
+    Lowercase and strip accents so "MEMORÍA", "memoria" and "Memoria" match.
+    """
+    text = unicodedata.normalize("NFKD", str(text))
+    return "".join(c for c in text if not unicodedata.combining(c)).lower()
+
+def _trigrams(text):
+    return {text[k:k + 3] for k in range(len(text) - 2)}
+
+class TrigramIndex:
+    """
+    Substring index over one text per row.
+    Each term of a query narrows the candidates through the posting sets of
+    its trigrams, and the candidates are then checked with a plain substring
+    test (no regex, so filenames with "(", "+", "[" etc. are safe).
+    Terms are AND-ed: every term must appear in the row.
+    """
+    def __init__(self, texts):
+        self.texts = [normalize_text(t) for t in texts]
+        self.postings = {}
+        for row, text in enumerate(self.texts):
+            for gram in _trigrams(text):
+                self.postings.setdefault(gram, set()).add(row)
+
+    def __len__(self):
+        return len(self.texts)
+
+    def _candidates(self, term):
+        grams = _trigrams(term)
+        if not grams:
+            return None # Term shorter than 3 chars: no pruning possible
+        sets = sorted((self.postings.get(g, set()) for g in grams), key=len)
+        candidates = set(sets[0])
+        for s in sets[1:]:
+            if not candidates: break
+            candidates &= s
+        return candidates
+
+    def search(self, query):
+        """
+        Returns the sorted row positions matching every term of the query,
+        or None if the query has no terms (i.e. no filtering).
+        """
+        terms = normalize_text(query).split()
+        if not terms: return None
+
+        result = None
+        # Longest terms first: they have the most selective trigrams
+        for term in sorted(set(terms), key=len, reverse=True):
+            candidates = self._candidates(term)
+            if candidates is None:
+                candidates = result if result is not None else range(len(self.texts))
+            elif result is not None:
+                candidates &= result
+            result = {row for row in candidates if term in self.texts[row]}
+            if not result: break
+        return sorted(result)
@@ -1,6 +1,17 @@
 import requests
 import json
 import os
+from datetime import datetime, timezone
+
+import notes_store
+
+REQUEST_TIMEOUT = (5, 30) # (connect, read) seconds
+PAGE_SIZE = 1000 # Rows per GET when pulling
+PULL_STATE_FILE = "supabase_pull.json" # High-water mark of the last pull
+PUSH_DEFAULT_STATUS = "Review" # Status pushed for documents that never had one
+
+# Remote column -> local notes field
+REMOTE_FIELDS = {"status": "status", "important": "reviewed", "notes": "notes", "description": "description"}
 
 class SupabaseSync:
     def __init__(self):
@@ -21,7 +32,7 @@ class SupabaseSync:
         data = {
             "project_id": self.project_id,
             "document_number": str(path_key)[:100],
-            "status": metadata.get("status", "Review"),
+            "status": metadata.get("status", PUSH_DEFAULT_STATUS),
             "important": metadata.get("reviewed", False) or metadata.get("important", False),
             "notes": metadata.get("notes", ""),
             "description": metadata.get("description", "")
@@ -31,7 +42,8 @@ class SupabaseSync:
             resp = requests.post(
                 f"{self.url}/rest/v1/oficios",
                 headers=self.headers,
-                json=data
+                json=data,
+                timeout=REQUEST_TIMEOUT
             )
             return resp.status_code in [200, 201, 204]
         except Exception:
@@ -39,10 +51,134 @@ class SupabaseSync:
 
     def get_all_oficios(self):
         try:
-            resp = requests.get(
-                f"{self.url}/rest/v1/oficios?project_id=eq.{self.project_id}",
-                headers=self.headers
-            )
-            return resp.json() if resp.status_code == 200 else []
+            return [row for page in self.pull_oficios() for row in page]
         except:
             return []
+
+    def pull_oficios(self, since=None, page_size=PAGE_SIZE):
+        """
+        Yields pages (lists of rows) of the project's oficios ordered by
+        (updated_at, document_number), starting after the key `since`
+        (an (updated_at, document_number) pair, None = from the start).
+        Keyset pagination: each page continues from the last row of the
+        previous one, so rows written meanwhile are neither skipped nor repeated.
+        Raises on HTTP/network errors; the pages already yielded stay valid.
+        """
+        params = {
+            "select": ",".join(["document_number", "updated_at"] + list(REMOTE_FIELDS)),
+            "project_id": f"eq.{self.project_id}",
+            "order": "updated_at.asc,document_number.asc",
+            "limit": str(page_size)
+        }
+        while True:
+            if since:
+                ts, doc = (_quote(v) for v in since)
+                params["or"] = f"(updated_at.gt.{ts},and(updated_at.eq.{ts},document_number.gt.{doc}))"
+            resp = requests.get(f"{self.url}/rest/v1/oficios", headers=self.headers, params=params, timeout=REQUEST_TIMEOUT)
+            resp.raise_for_status()
+            page = resp.json()
+            if not page: return
+            yield page
+            if len(page) < page_size: return
+            since = (page[-1]["updated_at"], page[-1]["document_number"])
+
+    def pull(self, store, state_path=PULL_STATE_FILE):
+        """
+        Merges the oficios changed since the last pull into a NotesStore.
+        Conflict rules, for a document whose fields differ from the remote row:
+          - not edited locally since the last pull: remote wins
+          - edited: the most recent change wins (remote updated_at vs local save)
+        The high-water mark is saved after every page, so an interrupted pull
+        resumes where it stopped. Returns (applied IDs, IDs where local won).
+        """
+        state = load_pull_state(state_path)
+        since = (state["updated_at"], state["document_number"]) if state.get("updated_at") else None
+        local_changes = store.changed_since(state.get("local_ts", ""))
+        applied, kept = [], []
+        for page in self.pull_oficios(since):
+            data = store.refresh().data
+            ids = _resolve_ids(page, data)
+            changes = {}
+            for row, fid in zip(page, ids):
+                if fid is None: continue
+                fields = remote_changes(row, data.get(fid), local_changes.get(fid))
+                if fields is None:
+                    kept.append(fid)
+                elif fields:
+                    changes[fid] = fields
+            if changes:
+                previous, snapshot, conflicts = store.apply_changes(changes)
+                # A conflict here is a local save that landed during the pull: it is newer
+                kept.extend(c.fid for c in conflicts)
+                applied.extend(fid for fid in changes if snapshot.data.get(fid) is not previous.data.get(fid))
+            state.update(updated_at=page[-1]["updated_at"], document_number=page[-1]["document_number"])
+            save_pull_state(state_path, state)
+        # Stamped after merging, so the pull's own writes don't count as local edits next time
+        state["local_ts"] = notes_store.now_stamp()
+        save_pull_state(state_path, state)
+        return applied, sorted(set(kept))
+
+# --- Pull helpers ---
+def _quote(value):
+    # PostgREST: double-quoted values may contain , . : ( ) and +
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+def _resolve_ids(page, data):
+    """Local ID of each row. document_number holds the ID cut to 100 characters."""
+    by_prefix = None
+    ids = []
+    for row in page:
+        doc = row.get("document_number") or ""
+        if doc in data or len(doc) < 100:
+            ids.append(doc)
+            continue
+        if by_prefix is None:
+            by_prefix = {}
+            for fid in data:
+                if len(fid) > 100: by_prefix.setdefault(fid[:100], []).append(fid)
+        matches = by_prefix.get(doc, [])
+        ids.append(matches[0] if len(matches) == 1 else None) # Ambiguous: skipped
+    return ids
+
+def _parse_time(value):
+    """Aware datetime from a Supabase timestamp or a notes stamp (UTC, see notes_store.now_stamp)."""
+    try:
+        if "T" in value and "-" in value[:10]:
+            return datetime.fromisoformat(value.replace("Z", "+00:00")).astimezone()
+        return datetime.strptime(value, "%Y%m%dT%H%M%S.%f").replace(tzinfo=timezone.utc)
+    except (TypeError, ValueError):
+        return None
+
+def remote_changes(row, entry, local_ts=None):
+    """
+    {field: (seen, new)} to bring entry up to the remote row, or None if the
+    row differs but loses to a newer local change (local_ts: stamp of the
+    document's last local save since the previous pull, if any).
+    """
+    if isinstance(entry, str): entry = {"notes": entry}
+    entry = entry or {}
+    fields = {}
+    for column, field in REMOTE_FIELDS.items():
+        if column not in row or row[column] is None: continue
+        new = row[column]
+        if field == "status" and new == PUSH_DEFAULT_STATUS and "status" not in entry: continue
+        current = entry.get(field, notes_store.FIELD_DEFAULTS.get(field))
+        if current != new: fields[field] = (current, new)
+    if fields and local_ts:
+        remote_time, local_time = _parse_time(row.get("updated_at")), _parse_time(local_ts)
+        if remote_time and local_time and local_time > remote_time:
+            return None
+    return fields
+
+def load_pull_state(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_pull_state(path, state):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=4)
+    os.replace(tmp_path, path)
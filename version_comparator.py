@@ -1,7 +1,10 @@
 import os
 import difflib
-import pypdf
+import hashlib
+import html
+import json
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
 
 def get_file_info(dir_path):
@@ -37,6 +40,45 @@ def get_file_info(dir_path):
             }
     return files_info
 
+def _compare_entry(rel_path, v1_files, v2_files):
+    """
+    Builds the comparison row of a single relative path.
+    Status: NEW, REMOVED, MODIFIED, SAME
+    """
+    in_v1 = rel_path in v1_files
+    in_v2 = rel_path in v2_files
+    
+    status = "UNKNOWN"
+    p1 = v1_files[rel_path]["path"] if in_v1 else None
+    p2 = v2_files[rel_path]["path"] if in_v2 else None
+    d1 = v1_files[rel_path]["mtime"] if in_v1 else None
+    d2 = v2_files[rel_path]["mtime"] if in_v2 else None
+    s1 = v1_files[rel_path]["size"] if in_v1 else 0
+    s2 = v2_files[rel_path]["size"] if in_v2 else 0
+    
+    if in_v1 and in_v2:
+        # Check for modification (size or content - here just size/name for speed, 
+        # maybe precise later)
+        if s1 != s2:
+            status = "MODIFIED"
+        else:
+            status = "SAME"
+    elif in_v2 and not in_v1:
+        status = "NEW"
+    elif in_v1 and not in_v2:
+        status = "REMOVED"
+        
+    return {
+        "Archivo": rel_path,
+        "Estado": status,
+        "PathV1": p1,
+        "PathV2": p2,
+        "Fecha V1": d1,
+        "Fecha V2": d2,
+        "SizeV1": s1,
+        "SizeV2": s2
+    }
+
 def compare_folders(dir_v1, dir_v2):
     """
     Compares two directories. 
@@ -47,50 +89,17 @@ def compare_folders(dir_v1, dir_v2):
     v2_files = get_file_info(dir_v2)
     
     all_files = set(v1_files.keys()) | set(v2_files.keys())
-    
-    results = []
-    
-    for f in all_files:
-        in_v1 = f in v1_files
-        in_v2 = f in v2_files
-        
-        status = "UNKNOWN"
-        p1 = v1_files[f]["path"] if in_v1 else None
-        p2 = v2_files[f]["path"] if in_v2 else None
-        d1 = v1_files[f]["mtime"] if in_v1 else None
-        d2 = v2_files[f]["mtime"] if in_v2 else None
-        s1 = v1_files[f]["size"] if in_v1 else 0
-        s2 = v2_files[f]["size"] if in_v2 else 0
-        
-        if in_v1 and in_v2:
-            # Check for modification (size or content - here just size/name for speed, 
-            # maybe precise later)
-            if s1 != s2:
-                status = "MODIFIED"
-            else:
-                status = "SAME"
-        elif in_v2 and not in_v1:
-            status = "NEW"
-        elif in_v1 and not in_v2:
-            status = "REMOVED"
-            
-        results.append({
-            "Archivo": f,
-            "Estado": status,
-            "PathV1": p1,
-            "PathV2": p2,
-            "Fecha V1": d1,
-            "Fecha V2": d2,
-            "SizeV1": s1,
-            "SizeV2": s2
-        })
+    results = [_compare_entry(f, v1_files, v2_files) for f in all_files]
         
-    return pd.DataFrame(results)
+    df = pd.DataFrame(results)
+    df.attrs["folders"] = (dir_v1, dir_v2) # Key of the summary cache (see batch_summarize_changes)
+    return df
 
 def extract_pdf_text(filepath, max_pages=None):
     """
     Extracts text from a PDF.
     """
+    import pypdf # Loaded on the first extraction, not when the module is imported
     text = ""
     try:
         reader = pypdf.PdfReader(filepath)
@@ -119,45 +128,299 @@ def generate_text_diff(text1, text2):
     d = difflib.HtmlDiff()
     return d.make_file(t1_lines, t2_lines, fromdesc="Versión Anterior (V1)", todesc="Versión Actual (V2)")
 
-def summarize_changes(text1, text2):
+def compute_diff_hunks(text1, text2, context=3):
     """
-    Returns a list of structured changes.
+    Splits the line diff of two texts into hunks of changed lines, each one
+    surrounded by `context` unchanged lines. Unchanged regions outside the
+    context are never materialized.
+    Returns a list of dicts: {header, rows} where rows are (tag, n1, n2, line).
+    """
+    t1_lines = text1.splitlines()
+    t2_lines = text2.splitlines()
+
+    matcher = difflib.SequenceMatcher(None, t1_lines, t2_lines)
+    hunks = []
+
+    for group in matcher.get_grouped_opcodes(context):
+        first, last = group[0], group[-1]
+        header = f"@@ -{first[1] + 1},{last[2] - first[1]} +{first[3] + 1},{last[4] - first[3]} @@"
+        rows = []
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                for k in range(i2 - i1):
+                    rows.append((" ", i1 + k + 1, j1 + k + 1, t1_lines[i1 + k]))
+                continue
+            if tag in ("replace", "delete"):
+                for k in range(i1, i2):
+                    rows.append(("-", k + 1, None, t1_lines[k]))
+            if tag in ("replace", "insert"):
+                for k in range(j1, j2):
+                    rows.append(("+", None, k + 1, t2_lines[k]))
+        hunks.append({"header": header, "rows": rows})
+
+    return hunks
+
+def render_diff_hunks(hunks, start=0, max_hunks=20, max_chars=200_000, start_row=0):
+    """
+    Renders a window of hunks as a compact HTML table, beginning at row
+    `start_row` of hunk `start`. Stops at `max_hunks` hunks or once the
+    payload reaches `max_chars`, whichever comes first. A hunk that does not
+    fit is cut at a row boundary, so a single huge hunk cannot blow the cap
+    (at least one row is always rendered, so the window always advances).
+    Returns (html, next_start); next_start is the (hunk, row) where the next
+    window begins, or None when everything was shown.
+    """
+    parts = [
+        "<style>"
+        "table.diff-hunks{font-family:monospace;font-size:12px;border-collapse:collapse;width:100%;}"
+        ".diff-hunks td{padding:0 6px;white-space:pre-wrap;vertical-align:top;}"
+        ".diff-hunks td.n{color:#94A3B8;text-align:right;width:3em;user-select:none;}"
+        ".diff-hunks tr.h td{background:#E2E8F0;color:#1e293b;font-weight:600;}"
+        ".diff-hunks tr.a td{background:#d1fae5;}"
+        ".diff-hunks tr.r td{background:#fee2e2;}"
+        "</style>",
+        '<table class="diff-hunks">'
+    ]
+    size = sum(len(p) for p in parts)
+    classes = {"+": "a", "-": "r", " ": ""}
+
+    idx, row = start, start_row
+    rendered = 0
+    while idx < len(hunks) and idx - start < max_hunks:
+        hunk = hunks[idx]
+        header = hunk["header"] if row == 0 else f'{hunk["header"]} (continuación)'
+        header = f'<tr class="h"><td colspan="4">{html.escape(header)}</td></tr>'
+        if rendered and size + len(header) > max_chars:
+            break
+        parts.append(header)
+        size += len(header)
+
+        rows = hunk["rows"]
+        while row < len(rows):
+            tag, n1, n2, line = rows[row]
+            chunk = (
+                f'<tr class="{classes[tag]}"><td class="n">{n1 or ""}</td><td class="n">{n2 or ""}</td>'
+                f'<td>{tag}</td><td>{html.escape(line)}</td></tr>'
+            )
+            if rendered and size + len(chunk) > max_chars:
+                break
+            parts.append(chunk)
+            size += len(chunk)
+            row += 1
+            rendered += 1
+        if row < len(rows):
+            parts.append(f'<tr class="h"><td colspan="4">… {len(rows) - row} líneas más en este cambio</td></tr>')
+            break
+        idx += 1
+        row = 0
+
+    parts.append("</table>")
+    next_start = (idx, row) if idx < len(hunks) else None
+    return "".join(parts), next_start
+
+def diff_line_changes(text1, text2):
+    """
+    Returns (added, removed): the stripped, non-empty lines that only exist
+    in text2 / text1 respectively.
     """
     t1_lines = [l.strip() for l in text1.splitlines() if l.strip()]
     t2_lines = [l.strip() for l in text2.splitlines() if l.strip()]
     
-    diff = difflib.ndiff(t1_lines, t2_lines)
-    
-    changes = {
-        "added": [],
-        "removed": [],
-        "modified_hint": [] # We will try to detect modifications roughly
-    }
-    
-    for line in diff:
+    added = []
+    removed = []
+    for line in difflib.ndiff(t1_lines, t2_lines):
         if line.startswith('+ '):
-            changes["added"].append(line[2:])
+            added.append(line[2:])
         elif line.startswith('- '):
-            changes["removed"].append(line[2:])
-            
-    # Simple heuristic to pair up modifications (if a remove is followed closely by an add)
-    # For now, just listing them is enough as a "written conclusion"
-    
+            removed.append(line[2:])
+    return added, removed
+
+def format_change_summary(added, removed):
+    """
+    Builds the written conclusion (list of markdown lines) for a set of changes.
+    """
     summary = []
     
-    if not changes["added"] and not changes["removed"]:
+    if not added and not removed:
         summary.append("✅ No se detectaron cambios textuales significativos.")
     else:
-        if changes["removed"]:
-            summary.append(f"🔴 **{len(changes['removed'])} líneas eliminadas/cambiadas (V1):**")
-            for l in changes["removed"][:10]: # Limit usage
+        if removed:
+            summary.append(f"🔴 **{len(removed)} líneas eliminadas/cambiadas (V1):**")
+            for l in removed[:10]: # Limit usage
                  summary.append(f"   - {l}")
-            if len(changes["removed"]) > 10: summary.append("   - ...")
+            if len(removed) > 10: summary.append("   - ...")
             
-        if changes["added"]:
-            summary.append(f"🟢 **{len(changes['added'])} líneas agregadas/nuevas (V2):**")
-            for l in changes["added"][:10]:
+        if added:
+            summary.append(f"🟢 **{len(added)} líneas agregadas/nuevas (V2):**")
+            for l in added[:10]:
                  summary.append(f"   - {l}")
-            if len(changes["added"]) > 10: summary.append("   - ...")
+            if len(added) > 10: summary.append("   - ...")
             
     return summary
+
+def summarize_changes(text1, text2):
+    """
+    Returns a list of structured changes.
+    """
+    added, removed = diff_line_changes(text1, text2)
+    return format_change_summary(added, removed)
+
+def _summarize_pair(item):
+    """
+    Worker for batch_summarize_changes. Runs in a separate process, so it
+    only receives plain paths and returns a plain dict.
+    """
+    rel_path, path_v1, path_v2 = item
+    text_v1 = extract_pdf_text(path_v1) if path_v1 and os.path.exists(path_v1) else ""
+    text_v2 = extract_pdf_text(path_v2) if path_v2 and os.path.exists(path_v2) else ""
+    added, removed = diff_line_changes(text_v1, text_v2)
+    return {
+        "Archivo": rel_path,
+        "Líneas Agregadas": len(added),
+        "Líneas Eliminadas": len(removed),
+        "Resumen": "\n".join(format_change_summary(added, removed)),
+        "PathV1": path_v1,
+        "PathV2": path_v2
+    }
+
+BATCH_COLUMNS = ["Archivo", "Líneas Agregadas", "Líneas Eliminadas", "Resumen", "PathV1", "PathV2"]
+
+# --- Persistent Summary Cache ---
+# PDF text extraction is the expensive part of a comparison, so the per-file
+# summaries are kept on disk per folder pair, keyed by the (size, mtime) of
+# both files. The folder walk itself always runs: it is what detects edits.
+COMPARISON_CACHE_DIR = "comparisons"
+
+def _summary_cache_file(cache_dir, dir_v1, dir_v2):
+    pair_key = hashlib.sha1(f"{os.path.abspath(dir_v1)}|{os.path.abspath(dir_v2)}".encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir, f"{pair_key}.json")
+
+def _entry_key(row):
+    return [int(row["SizeV1"]), row["Fecha V1"].timestamp(), int(row["SizeV2"]), row["Fecha V2"].timestamp()]
+
+def _load_summaries(cache_file):
+    try:
+        with open(cache_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_summaries(cache_file, summaries):
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        tmp_file = cache_file + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(summaries, f, ensure_ascii=False)
+        os.replace(tmp_file, cache_file)
+    except OSError:
+        pass # Cache is an optimization only
+
+def batch_summarize_changes(comp_df, max_workers=None, progress=None, cache_dir=COMPARISON_CACHE_DIR):
+    """
+    Runs summarize_changes for every MODIFIED PDF of a compare_folders result
+    across a process pool (PDF parsing is CPU bound).
+    Files whose size and mtime on both sides match the cached summary are not
+    parsed again; df.attrs["recomputed"] holds the number of files that were.
+    progress(done, total) is called as results arrive.
+    Returns a DataFrame with one row per file.
+    """
+    if comp_df.empty:
+        return pd.DataFrame(columns=BATCH_COLUMNS)
+
+    mod_pdfs = comp_df[
+        (comp_df["Estado"] == "MODIFIED") &
+        (comp_df["Archivo"].str.lower().str.endswith(".pdf"))
+    ]
+    folders = comp_df.attrs.get("folders")
+    cache_file = _summary_cache_file(cache_dir, *folders) if cache_dir and folders else None
+    cached = _load_summaries(cache_file) if cache_file else {}
+
+    results = []
+    items = []
+    keys = {}
+    for _, row in mod_pdfs.iterrows():
+        rel_path = row["Archivo"]
+        keys[rel_path] = _entry_key(row)
+        hit = cached.get(rel_path)
+        if hit and hit["key"] == keys[rel_path]:
+            results.append(dict(hit["row"], PathV1=row["PathV1"], PathV2=row["PathV2"]))
+        else:
+            items.append((rel_path, row["PathV1"], row["PathV2"]))
+    
+    if items:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(_summarize_pair, item): item for item in items}
+            for done, future in enumerate(as_completed(futures), start=1):
+                rel_path, path_v1, path_v2 = futures[future]
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    results.append({
+                        "Archivo": rel_path,
+                        "Líneas Agregadas": 0,
+                        "Líneas Eliminadas": 0,
+                        "Resumen": f"Error comparando: {e}",
+                        "PathV1": path_v1,
+                        "PathV2": path_v2
+                    })
+                if progress: progress(done, len(items))
+
+    if cache_file:
+        # Errors are not cached, so they are retried next time
+        _save_summaries(cache_file, {
+            r["Archivo"]: {"key": keys[r["Archivo"]], "row": {k: v for k, v in r.items() if k not in ("PathV1", "PathV2")}}
+            for r in results if not r["Resumen"].startswith("Error comparando:")
+        })
+    
+    df = pd.DataFrame(results, columns=BATCH_COLUMNS).sort_values("Archivo").reset_index(drop=True)
+    df.attrs["recomputed"] = len(items)
+    return df
+
+def compare_revision_chain(texts, labels):
+    """
+    Compares a whole revision chain (V1 -> V2 -> ... -> Vn) in a single pass.
+    Every line carries the label of the revision that introduced it and, if
+    it is gone later on, the one that removed it.
+    Returns (history_df, pairs_df):
+      history_df: [Línea, Introducida, Eliminada]
+      pairs_df: [Desde, Hasta, Líneas Agregadas, Líneas Eliminadas]
+    """
+    history = []
+    pairs = []
+    if not texts:
+        return pd.DataFrame(columns=["Línea", "Introducida", "Eliminada"]), pd.DataFrame(columns=["Desde", "Hasta", "Líneas Agregadas", "Líneas Eliminadas"])
+    
+    prev_lines = [l.strip() for l in texts[0].splitlines() if l.strip()]
+    live = [{"Línea": l, "Introducida": labels[0], "Eliminada": None} for l in prev_lines]
+    history.extend(live)
+    
+    for k in range(1, len(texts)):
+        cur_lines = [l.strip() for l in texts[k].splitlines() if l.strip()]
+        matcher = difflib.SequenceMatcher(None, prev_lines, cur_lines)
+        
+        next_live = []
+        added = 0
+        removed = 0
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == "equal":
+                next_live.extend(live[i1:i2])
+                continue
+            for record in live[i1:i2]:
+                record["Eliminada"] = labels[k]
+                removed += 1
+            for line in cur_lines[j1:j2]:
+                record = {"Línea": line, "Introducida": labels[k], "Eliminada": None}
+                next_live.append(record)
+                history.append(record)
+                added += 1
+        
+        pairs.append({
+            "Desde": labels[k - 1],
+            "Hasta": labels[k],
+            "Líneas Agregadas": added,
+            "Líneas Eliminadas": removed
+        })
+        live = next_live
+        prev_lines = cur_lines
+    
+    return pd.DataFrame(history, columns=["Línea", "Introducida", "Eliminada"]), pd.DataFrame(pairs)